@@ -0,0 +1,109 @@
+"""
+Mede a vazão de download e o ganho do cache local contra o servidor local (utils.local_server).
+
+Fases medidas, cada uma sobre um cache vazio criado para o benchmark:
+
+- frio: prefetch de todas as malhas, dados e de camadas do GeoSampa, com o cache vazio;
+- quente: o mesmo prefetch, com tudo em cache;
+- revalidação: o mesmo prefetch com revalidate=True (respostas 304);
+- leitura: download_malha do censo de 2010 lendo o shapefile e, em seguida, a cópia GeoParquet.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/bench_download.py [--latency 0.02] [--bandwidth 5M] [--scale 20]
+                                        [--error-rate 0.1] [--truncate-rate 0.1] [--max-workers 8]
+"""
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from os.path import (
+    abspath,
+    dirname,
+)
+import sys
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from utils.downloads import (
+    Censo,
+    DadosSpec,
+    GeoSampaSpec,
+    MalhaSpec,
+    Nivel,
+    RetryConfig,
+    download_malha,
+    get_metrics_collector,
+    parse_size,
+    prefetch,
+    set_mirror,
+    set_retry_config,
+)
+from utils.local_server import (
+    Faults,
+    LocalServer,
+)
+
+SPECS = [
+    MalhaSpec(Censo.CENSO_2000, Nivel.SETORES),
+    MalhaSpec(Censo.CENSO_2010, Nivel.SETORES),
+    MalhaSpec(Censo.CENSO_2010, Nivel.DISTRITOS),
+    MalhaSpec(Censo.CENSO_2022, Nivel.SETORES),
+    MalhaSpec(Censo.CENSO_2022, Nivel.DISTRITOS),
+    DadosSpec(Censo.CENSO_2000, Nivel.SETORES),
+    DadosSpec(Censo.CENSO_2010, Nivel.SETORES),
+    GeoSampaSpec('14_Patrim%F4nio%20Cultural%5C%5CBens%20Protegidos%5C%5CShapefile%5C%5CSIRGAS_SHP_benstombados'),
+    GeoSampaSpec('07_Prote%E7%E3o%20e%20Defesa%20Civil%5C%5CArea_Risco_Geologico_Atual%5C%5CShapefile%5C%5CSIRGAS_SHP_riscogeologicoatual'),
+]
+
+def phase(name:str, server:LocalServer, function) -> None:
+    """Executa a fase e imprime o tempo, o volume baixado, a vazão e as respostas do servidor."""
+    collector = get_metrics_collector()
+    collector.reset()
+    server.requests.clear()
+
+    started = perf_counter()
+    function()
+    elapsed = perf_counter() - started
+
+    summary = collector.summary()
+    mib = summary['bytes'] / 1024 ** 2
+    responses = ', '.join(f'{status}: {count}' for status, count in sorted(server.requests.items())) or '-'
+    print(f'{name:<14} {elapsed:8.3f} s  {mib:8.2f} MiB  {mib / elapsed:8.2f} MiB/s  respostas: {responses}')
+
+def main(argv:list[str]=None) -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--bandwidth', type=parse_size, default=None)
+    parser.add_argument('--scale', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--truncate-rate', type=float, default=0)
+    parser.add_argument('--max-workers', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    # com falhas injetadas, as novas tentativas não devem dominar o tempo medido
+    set_retry_config(RetryConfig(attempts=10, wait_initial=0.01, wait_max=0.1, failure_threshold=1000))
+
+    server = LocalServer(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        faults=Faults(error_rate=args.error_rate, truncate_rate=args.truncate_rate),
+        scale=args.scale,
+    )
+    with server, TemporaryDirectory() as cache_dir:
+        set_mirror(server.root)
+        # gera os arquivos sintéticos antes das medições
+        for spec in SPECS:
+            prefetch([spec], cache_dir=f'{cache_dir}/aquecimento')
+
+        run = lambda revalidate=False: prefetch(SPECS, max_workers=args.max_workers, cache_dir=cache_dir, revalidate=revalidate)
+        phase('frio', server, run)
+        phase('quente', server, run)
+        phase('revalidação', server, lambda: run(revalidate=True))
+        phase('leitura shp', server, lambda: download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir))
+        phase('leitura parquet', server, lambda: download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir))
+        set_mirror(None)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
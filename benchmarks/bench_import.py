@@ -0,0 +1,68 @@
+"""
+Mede o tempo de importação dos módulos de utils e garante que as dependências pesadas
+(geopandas, pandas, shapely, pyproj) não são carregadas só por importá-los.
+
+Uso (a partir da raiz do repositório):
+
+    python benchmarks/bench_import.py [--budget-ms 50] [--repeat 5]
+
+Termina com código 1 se algum módulo exceder o orçamento ou importar uma dependência pesada.
+"""
+from argparse import ArgumentParser
+from subprocess import run
+from os.path import (
+    abspath,
+    dirname,
+)
+import sys
+
+MODULES = ['utils.downloads', 'utils.geosampa_client', 'utils.geo']
+HEAVY_MODULES = ['geopandas', 'pandas', 'shapely', 'pyproj', 'numpy']
+ROOT = dirname(dirname(abspath(__file__)))
+
+SCRIPT = '''
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+elapsed = perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(elapsed * 1000, ','.join(heavy))
+'''
+
+def measure(module:str, repeat:int) -> tuple[float, list[str]]:
+    """Devolve o menor tempo de importação (ms) em interpretadores novos e as dependências pesadas carregadas."""
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        result = run(
+            [sys.executable, '-c', SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        elapsed, loaded = result.stdout.split(' ')
+        timings.append(float(elapsed))
+        heavy = [m for m in loaded.strip().split(',') if m]
+    return min(timings), heavy
+
+def main(argv:list[str]=None) -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in MODULES:
+        elapsed, heavy = measure(module, args.repeat)
+        status = 'ok'
+        if heavy or elapsed > args.budget_ms:
+            status = 'FALHOU'
+            failed = True
+        print(f'{module:<20} {elapsed:8.2f} ms  pesadas: {", ".join(heavy) or "-":<30} {status}')
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
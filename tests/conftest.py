@@ -0,0 +1,47 @@
+import pytest
+
+from utils.downloads import (
+    MetricsCollector,
+    RetryConfig,
+    get_metrics_collector,
+    set_cache_budget,
+    set_metrics_collector,
+    set_mirror,
+    set_retry_config,
+)
+from utils.local_server import LocalServer
+
+@pytest.fixture
+def server():
+    """Servidor local com os arquivos sintéticos, usado como espelho dos servidores originais."""
+    with LocalServer() as server:
+        set_mirror(server.root)
+        try:
+            yield server
+        finally:
+            set_mirror(None)
+
+@pytest.fixture
+def cache_dir(tmp_path) -> str:
+    return str(tmp_path / 'cache')
+
+@pytest.fixture
+def metrics() -> MetricsCollector:
+    """Um coletor de métricas vazio, substituído pelo anterior ao final do teste."""
+    previous = get_metrics_collector()
+    collector = MetricsCollector()
+    set_metrics_collector(collector)
+    try:
+        yield collector
+    finally:
+        set_metrics_collector(previous)
+
+@pytest.fixture(autouse=True)
+def fast_retries():
+    # as novas tentativas não esperam, e o limite do cache não vaza entre os testes
+    set_retry_config(RetryConfig(wait_initial=0.01, wait_max=0.01))
+    try:
+        yield
+    finally:
+        set_retry_config(RetryConfig())
+        set_cache_budget(None)
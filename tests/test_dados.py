@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import downloads
+from utils.downloads import (
+    Censo,
+    Nivel,
+    download_dados,
+    download_dados_many,
+)
+
+# as funções privadas do módulo (prefixo __) são acessadas pelo nome completo
+compact_numeric = getattr(downloads, '__compact_numeric')
+
+def parse_sources(metrics) -> list[str]:
+    return [e['source'] for e in metrics.events if e['event'] == 'parse']
+
+def test_leitura_sem_tipos_preserva_a_planilha(server, cache_dir, metrics):
+    df = download_dados(Censo.CENSO_2010, Nivel.SETORES, 'Domicilio01_SP1.XLS', cache_dir=cache_dir, typed=False)
+
+    # os valores continuam como na planilha: números e o marcador 'X'
+    assert df['V002'].dtype == object
+    assert (df['V002'] == 'X').any()
+    df.loc[df['V002'] == 'X', 'V002'] = np.nan
+    assert df['V002'].dropna().astype(int).sum() > 0
+
+    # a planilha mistura números e texto: não há cópia Parquet, e a próxima leitura volta ao original
+    again = download_dados(Censo.CENSO_2010, Nivel.SETORES, 'Domicilio01_SP1.XLS', cache_dir=cache_dir, typed=False)
+    assert parse_sources(metrics) == ['original', 'original']
+    assert again['V002'].dtype == object
+
+def test_copia_parquet_da_leitura_tipada(server, cache_dir, metrics):
+    for arquivo in ('Domicilio01_SP1.XLS', 'DomicilioRenda_SP1.XLS', 'Domicilio02_SP1.xls'):
+        first = download_dados(Censo.CENSO_2010, Nivel.SETORES, arquivo, cache_dir=cache_dir)
+        second = download_dados(Censo.CENSO_2010, Nivel.SETORES, arquivo, cache_dir=cache_dir)
+        assert second.equals(first)
+
+    assert parse_sources(metrics) == ['original', 'parquet'] * 3
+
+def test_uniao_das_planilhas_com_colunas_repetidas(server, cache_dir):
+    arquivos = ['Domicilio01_SP1.XLS', 'Domicilio02_SP1.xls']
+    columns = {'Domicilio01_SP1.XLS': ['Cod_setor', 'V001'], 'Domicilio02_SP1.xls': ['Cod_setor', 'V001', 'V002']}
+    dfs = download_dados_many(Censo.CENSO_2010, Nivel.SETORES, arquivos, columns=columns, cache_dir=cache_dir)
+    merged = download_dados_many(Censo.CENSO_2010, Nivel.SETORES, arquivos, columns=columns, cache_dir=cache_dir, merge=True)
+
+    # V001 aparece nas duas planilhas e recebe o sufixo em ambas; V002 mantém o nome
+    assert list(merged.columns) == ['Cod_setor', 'V001_Domicilio01_SP1', 'V001_Domicilio02_SP1', 'V002']
+    merged = merged.set_index('Cod_setor')
+    for arquivo, df in dfs.items():
+        df = df.set_index('Cod_setor')
+        assert merged.loc[df.index, f'V001_{arquivo[:-4]}'].equals(df['V001'])
+
+@pytest.mark.parametrize('arquivo, dtypes', [
+    ('Domicilio01_SP1.XLS', {'dom_total': 'Int32', 'V002': 'Int32'}),
+    ('DomicilioRenda_SP1.XLS', {'V001': 'Float64', 'rend_total': 'Float64'}),
+])
+def test_leitura_tipada_com_valores_suprimidos(server, cache_dir, arquivo, dtypes):
+    raw = download_dados(Censo.CENSO_2010, Nivel.SETORES, arquivo, cache_dir=cache_dir, typed=False, cache_parquet=False)
+    df = download_dados(Censo.CENSO_2010, Nivel.SETORES, arquivo, cache_dir=cache_dir, rename=True, cache_parquet=False)
+
+    # as variáveis registradas recebem o nome semântico; as demais mantêm o código
+    assert {col: str(dtype) for col, dtype in df.dtypes.items() if col != 'Cod_setor'} == dtypes
+    assert df['Cod_setor'].equals(raw['Cod_setor'].astype(str))
+    for (col, values), original in zip(df.drop(columns='Cod_setor').items(), ['V001', 'V002']):
+        suprimido = raw[original] == 'X'
+        assert suprimido.any()
+        assert values.isna().equals(suprimido)
+        assert (values[~suprimido].astype(float) == raw.loc[~suprimido, original].astype(float)).all()
+
+def test_menor_tipo_anulavel_das_variaveis():
+    assert str(compact_numeric(pd.Series([1.0, np.nan, 3.0])).dtype) == 'Int32'
+    assert str(compact_numeric(pd.Series([1, 2**31])).dtype) == 'Int64'
+    assert str(compact_numeric(pd.Series([1.5, np.nan])).dtype) == 'Float64'
+    assert compact_numeric(pd.Series([1.0, np.nan])).isna().tolist() == [False, True]
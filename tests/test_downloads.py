@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from os.path import (
+    basename,
+    exists,
+    getsize,
+    join,
+)
+from threading import Barrier
+from time import sleep
+from urllib.error import ContentTooShortError
+from urllib.parse import urlparse
+
+import pytest
+
+from utils.downloads import (
+    PART_SUFFIX,
+    USE_SUFFIX,
+    Censo,
+    FileLock,
+    Nivel,
+    RetryConfig,
+    download_file,
+    download_malha,
+    gc_cache,
+    get_malha_url,
+    set_cache_budget,
+    set_retry_config,
+)
+from utils.local_server import Faults
+
+def served(server, url:str) -> bytes:
+    """O conteúdo que o servidor local entrega para a URL original."""
+    parsed = urlparse(url)
+    archive, _ = server.archive(f'/{parsed.netloc}{parsed.path}')
+    return archive.content
+
+def read(path:str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def interrupt_download(server, url:str, file_dir:str, cache_dir:str) -> str:
+    """Deixa um download parcial de url no cache, com a transferência derrubada na metade."""
+    server.faults = Faults(truncate_rate=1)
+    set_retry_config(RetryConfig(attempts=1))
+    with pytest.raises(ContentTooShortError):
+        download_file(url, file_dir, cache_dir=cache_dir)
+    server.faults = Faults()
+    set_retry_config(RetryConfig(wait_initial=0.01, wait_max=0.01))
+
+    part_path = join(file_dir, f'{basename(urlparse(url).path)}{PART_SUFFIX}')
+    assert 0 < getsize(part_path) < len(served(server, url))
+    return part_path
+
+def test_download_interrompido_e_retomado_com_range(server, cache_dir):
+    url = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+    file_dir = join(cache_dir, 'malhas')
+    part_path = interrupt_download(server, url, file_dir, cache_dir)
+    offset = getsize(part_path)
+
+    path = download_file(url, file_dir, cache_dir=cache_dir)
+
+    assert read(path) == served(server, url)
+    assert server.requests[206] == 1
+    assert not exists(part_path)
+    assert offset > 0
+
+def test_download_parcial_descartado_quando_o_arquivo_muda(server, cache_dir, metrics):
+    url = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+    file_dir = join(cache_dir, 'malhas')
+    interrupt_download(server, url, file_dir, cache_dir)
+
+    # uma nova versão do arquivo (outro ETag): o If-Range falha e o servidor envia o arquivo inteiro
+    server.set_scale(2)
+    path = download_file(url, file_dir, cache_dir=cache_dir)
+
+    assert read(path) == served(server, url)
+    assert server.requests[206] == 0
+    assert [e['status'] for e in metrics.events if e['event'] == 'download'] == [200, 200]
+
+def test_revalidacao_com_304(server, cache_dir, metrics):
+    url = get_malha_url(Censo.CENSO_2010, Nivel.DISTRITOS)
+    file_dir = join(cache_dir, 'malhas')
+    path = download_file(url, file_dir, cache_dir=cache_dir)
+
+    assert download_file(url, file_dir, cache_dir=cache_dir, revalidate=True) == path
+    summary = metrics.summary()
+    assert server.requests[304] == 1
+    assert summary['downloads'] == 1
+    assert summary['cache']['not_modified'] == 1
+
+def test_lock_por_arquivo_evita_downloads_simultaneos(server, cache_dir, metrics):
+    url = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+    file_dir = join(cache_dir, 'malhas')
+    server.latency = 0.2
+
+    with ThreadPoolExecutor(4) as executor:
+        paths = list(executor.map(lambda _: download_file(url, file_dir, cache_dir=cache_dir), range(4)))
+
+    assert len(set(paths)) == 1
+    assert read(paths[0]) == served(server, url)
+    assert metrics.summary()['downloads'] == 1
+
+def test_lock_ocupado_impede_outro_acesso(tmp_path):
+    path = str(tmp_path / 'arquivo.lock')
+    with FileLock(path):
+        with pytest.raises(TimeoutError):
+            FileLock(path, timeout=0).acquire()
+    with FileLock(path, timeout=0):
+        pass
+
+def test_gc_remove_o_acessado_ha_mais_tempo(server, cache_dir):
+    file_dir = join(cache_dir, 'malhas')
+    setores = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+    distritos = get_malha_url(Censo.CENSO_2010, Nivel.DISTRITOS)
+
+    # o manifesto registra o último acesso com resolução de segundos
+    setores_path = download_file(setores, file_dir, cache_dir=cache_dir)
+    sleep(1.1)
+    distritos_path = download_file(distritos, file_dir, cache_dir=cache_dir)
+    sleep(1.1)
+    download_file(setores, file_dir, cache_dir=cache_dir)
+
+    assert gc_cache(cache_dir, getsize(setores_path)) == [distritos_path]
+    assert exists(setores_path)
+    assert not exists(distritos_path)
+
+def test_gc_preserva_o_arquivo_em_leitura(server, cache_dir):
+    file_dir = join(cache_dir, 'malhas')
+    setores_path = download_file(get_malha_url(Censo.CENSO_2010, Nivel.SETORES), file_dir, cache_dir=cache_dir)
+    distritos_path = download_file(get_malha_url(Censo.CENSO_2010, Nivel.DISTRITOS), file_dir, cache_dir=cache_dir)
+
+    # o lock de uso é o que __prepare_cache entrega às funções de leitura
+    with FileLock(f'{setores_path}{USE_SUFFIX}', shared=True), FileLock(f'{setores_path}{USE_SUFFIX}', shared=True):
+        assert gc_cache(cache_dir, 0) == [distritos_path]
+        assert exists(setores_path)
+
+    assert gc_cache(cache_dir, 0) == [setores_path]
+
+def test_limite_do_cache_respeitado_em_downloads_seguidos(server, cache_dir):
+    file_dir = join(cache_dir, 'malhas')
+    urls = [get_malha_url(Censo.CENSO_2010, nivel) for nivel in (Nivel.DISTRITOS, Nivel.SETORES)]
+    set_cache_budget(1)
+
+    # cada download cabe sozinho no limite e remove o anterior, mesmo que acessado há pouco
+    paths = [download_file(url, file_dir, cache_dir=cache_dir) for url in urls]
+
+    assert not exists(paths[0])
+    assert exists(paths[1])
+
+def test_chamadas_simultaneas_compartilham_a_leitura(server, cache_dir, metrics):
+    server.latency = 0.3
+    barrier = Barrier(8)
+
+    def load(_):
+        barrier.wait()
+        return download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir, cache_parquet=False)
+
+    with ThreadPoolExecutor(8) as executor:
+        gdfs = list(executor.map(load, range(8)))
+
+    summary = metrics.summary()
+    assert summary['coalesced'] == 7
+    assert sum(parse['count'] for parse in summary['parse'].values()) == 1
+    assert summary['downloads'] == 1
+    assert all(len(gdf) == len(gdfs[0]) for gdf in gdfs)
+
+    # cada chamada recebe a sua cópia rasa
+    gdfs[0]['nova'] = 1
+    assert 'nova' not in gdfs[1].columns
@@ -0,0 +1,81 @@
+from os import makedirs
+from os.path import (
+    basename,
+    join,
+)
+from re import fullmatch
+from urllib.parse import (
+    quote,
+    unquote,
+    urlparse,
+)
+
+import pytest
+
+from utils.downloads import (
+    Censo,
+    Nivel,
+    OfflineError,
+    download_file,
+    download_geosampa_shapefile,
+    get_malha_url,
+    get_shapefile_url,
+    set_mirror,
+    set_offline,
+)
+from utils.local_server import archive_for
+
+BENS_TOMBADOS = '14_Patrim%F4nio%20Cultural%5C%5CBens%20Protegidos%5C%5CShapefile%5C%5CSIRGAS_SHP_benstombados'
+
+@pytest.fixture
+def mirror_dir(tmp_path) -> str:
+    root = str(tmp_path / 'espelho')
+    set_mirror(f'file://{root}')
+    try:
+        yield root
+    finally:
+        set_mirror(None)
+
+def read(path:str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_modo_offline_usa_apenas_o_cache(server, cache_dir, metrics):
+    file_dir = join(cache_dir, 'malhas')
+    setores = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+    path = download_file(setores, file_dir, cache_dir=cache_dir)
+    requests = sum(server.requests.values())
+
+    set_offline(True)
+    try:
+        # o arquivo em cache é usado sem revalidação; o ausente não é buscado
+        assert download_file(setores, file_dir, cache_dir=cache_dir, revalidate=True) == path
+        with pytest.raises(OfflineError):
+            download_file(get_malha_url(Censo.CENSO_2010, Nivel.DISTRITOS), file_dir, cache_dir=cache_dir)
+    finally:
+        set_offline(False)
+
+    assert sum(server.requests.values()) == requests
+    assert [e['status'] for e in metrics.events if e['event'] == 'cache'] == ['miss', 'hit', 'offline_miss']
+
+def test_espelho_local_com_parametros_na_url(mirror_dir, cache_dir):
+    url = get_shapefile_url(BENS_TOMBADOS)
+    archive = archive_for(url)
+    parsed = urlparse(url)
+
+    # o diretório dos parâmetros é a query string decodificada como latin-1 e codificada por completo
+    query_dir = quote(unquote(parsed.query, encoding='latin-1'), safe='')
+    assert fullmatch(r'[\w.\-~%]+', query_dir)
+    directory = join(mirror_dir, parsed.netloc, *parsed.path.strip('/').split('/'), query_dir)
+    makedirs(directory)
+    with open(join(directory, archive.filename), 'wb') as f:
+        f.write(archive.content)
+
+    path = download_geosampa_shapefile(BENS_TOMBADOS, cache_dir=cache_dir)
+
+    assert basename(path) == archive.filename
+    assert read(path) == archive.content
+
+def test_espelho_local_sem_o_arquivo(mirror_dir, cache_dir):
+    with pytest.raises(FileNotFoundError):
+        download_file(get_malha_url(Censo.CENSO_2010, Nivel.SETORES), join(cache_dir, 'malhas'), cache_dir=cache_dir)
@@ -0,0 +1,22 @@
+from utils.geosampa_client import (
+    IDENTIFICADORES,
+    GeoSampaClient,
+)
+
+LAYER = 'quadra_viaria_editada'
+
+def test_blocos_sobrepostos_sem_feicoes_repetidas(server, cache_dir):
+    client = GeoSampaClient(page_size=50, cache_dir=cache_dir)
+    total = client.count_features(LAYER)
+
+    # as feições na divisa entre dois blocos são devolvidas por ambos
+    tiles = client.plan_tiles(LAYER, max_features=50)
+    assert len(tiles) > 1
+    assert sum(count for _, count in tiles) > total
+
+    gdf = client.read_feature(LAYER, tiled=True)
+    assert len(gdf) == total
+    assert gdf[IDENTIFICADORES[LAYER]].is_unique
+
+    paged = client.read_feature(LAYER)
+    assert sorted(paged[IDENTIFICADORES[LAYER]]) == sorted(gdf[IDENTIFICADORES[LAYER]])
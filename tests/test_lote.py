@@ -0,0 +1,59 @@
+from os.path import join
+
+from geopandas import GeoDataFrame
+
+from utils.downloads import (
+    Censo,
+    DadosSpec,
+    MalhaSpec,
+    Nivel,
+    Plano,
+    TabelaSpec,
+    download_dados,
+    get_dados_url,
+    get_malha_url,
+    get_shapefile_url,
+    load_batch,
+    plan_batch,
+)
+
+BENS_TOMBADOS = '14_Patrim%F4nio%20Cultural%5C%5CBens%20Protegidos%5C%5CShapefile%5C%5CSIRGAS_SHP_benstombados'
+
+DOMICILIO01 = TabelaSpec(Censo.CENSO_2010, Nivel.SETORES, 'Domicilio01_SP1.XLS')
+DOMICILIO02 = TabelaSpec(Censo.CENSO_2010, Nivel.SETORES, 'Domicilio02_SP1.xls')
+SPECS = [
+    DOMICILIO01,
+    MalhaSpec(Censo.CENSO_2010, Nivel.SETORES),
+    DadosSpec(Censo.CENSO_2010, Nivel.SETORES),
+    BENS_TOMBADOS,
+    DOMICILIO02,
+    (Censo.CENSO_2010, Nivel.SETORES),
+    DOMICILIO01,
+]
+
+def test_plano_agrupa_por_arquivo_compactado(cache_dir):
+    file_dir = join(cache_dir, 'setores', '2010')
+
+    assert plan_batch(SPECS, cache_dir) == [
+        Plano(get_dados_url(Censo.CENSO_2010, Nivel.SETORES), file_dir, [DOMICILIO01, DadosSpec(Censo.CENSO_2010, Nivel.SETORES), DOMICILIO02]),
+        Plano(get_malha_url(Censo.CENSO_2010, Nivel.SETORES), file_dir, [MalhaSpec(Censo.CENSO_2010, Nivel.SETORES), (Censo.CENSO_2010, Nivel.SETORES)]),
+        Plano(get_shapefile_url(BENS_TOMBADOS), join(cache_dir, 'geosampa_shp'), [BENS_TOMBADOS]),
+    ]
+
+def test_lote_baixa_cada_arquivo_uma_vez(server, cache_dir, metrics):
+    results = load_batch(SPECS, cache_dir=cache_dir, max_workers=2)
+
+    summary = metrics.summary()
+    assert summary['downloads'] == 3
+    # as duas planilhas são lidas juntas, do mesmo zip
+    assert sorted(dataset for dataset, _ in summary['parse'] if dataset.startswith('dados')) == [
+        'dados/setores/2010/Domicilio01_SP1.XLS',
+        'dados/setores/2010/Domicilio02_SP1.xls',
+    ]
+
+    assert list(results) == list(dict.fromkeys(SPECS))
+    assert results[DOMICILIO01].equals(download_dados(Censo.CENSO_2010, Nivel.SETORES, 'Domicilio01_SP1.XLS', cache_dir=cache_dir))
+    assert isinstance(results[MalhaSpec(Censo.CENSO_2010, Nivel.SETORES)], GeoDataFrame)
+    assert results[(Censo.CENSO_2010, Nivel.SETORES)].equals(results[MalhaSpec(Censo.CENSO_2010, Nivel.SETORES)])
+    assert results[DadosSpec(Censo.CENSO_2010, Nivel.SETORES)].endswith('.zip')
+    assert results[BENS_TOMBADOS].startswith(join(cache_dir, 'geosampa_shp'))
@@ -0,0 +1,115 @@
+from io import BytesIO
+from json import (
+    dumps,
+    loads,
+)
+from zipfile import ZipFile
+
+import geopandas
+import pytest
+from geopandas import read_file
+from geopandas.testing import assert_geodataframe_equal
+
+from utils import downloads
+from utils.downloads import (
+    Censo,
+    Nivel,
+    download_malha,
+)
+
+# as funções privadas do módulo (prefixo __) são acessadas pelo nome completo
+iter_geojson_features = getattr(downloads, '__iter_geojson_features')
+read_geojson_stream = getattr(downloads, '__read_geojson_stream')
+read_vector = getattr(downloads, '__read_vector')
+
+def feature_collection(crs:dict|None) -> dict:
+    features = [
+        {
+            'type': 'Feature',
+            # textos com chaves, colchetes, aspas escapadas e caracteres de vários bytes
+            'properties': {'CD_SETOR': f'35503080{i:07d}', 'NM': f'São João {{[{i}]}} "x"', 'AREA': i * 1.0625e-3},
+            'geometry': {'type': 'Point', 'coordinates': [-46.6 + i * 1e-4, -23.5 - i * 1e-4]},
+        }
+        for i in range(25)
+    ]
+    return {'type': 'FeatureCollection', 'name': 'setores', 'crs': crs, 'features': features}
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_tokenizador_independe_dos_blocos(monkeypatch, chunk_size, indent):
+    document = feature_collection(None)
+    # CHUNK_SIZE pequeno corta números, textos e caracteres UTF-8 entre dois blocos
+    monkeypatch.setattr(downloads, 'CHUNK_SIZE', chunk_size)
+    content = ('﻿' + dumps(document, ensure_ascii=False, indent=indent)).encode('utf-8')
+
+    members = {}
+    features = list(iter_geojson_features(BytesIO(content), members))
+
+    assert features == document['features']
+    assert members == {'type': 'FeatureCollection', 'name': 'setores', 'crs': None}
+
+def test_tokenizador_rejeita_documento_truncado(monkeypatch):
+    monkeypatch.setattr(downloads, 'CHUNK_SIZE', 16)
+    content = dumps(feature_collection(None)).encode('utf-8')[:-40]
+    with pytest.raises(ValueError):
+        list(iter_geojson_features(BytesIO(content), {}))
+
+@pytest.mark.parametrize('crs', [None, {'type': 'name', 'properties': None}, {'type': 'name', 'properties': {'name': 'EPSG:4674'}}])
+def test_leitura_em_fluxo_com_crs_nulo(tmp_path, crs):
+    document = feature_collection(crs)
+    path = tmp_path / 'malha.zip'
+    with ZipFile(path, 'w') as z:
+        z.writestr('malha.json', dumps(document))
+
+    gdf = read_geojson_stream(str(path), field='CD_SETOR', values={f['properties']['CD_SETOR'] for f in document['features'][:10]})
+    reference = read_file(f'zip://{path}!malha.json')
+
+    assert len(gdf) == 10
+    assert gdf.crs == reference.crs
+    assert gdf.crs.to_epsg() == (4674 if crs and crs['properties'] else 4326)
+    assert list(gdf.columns) == list(reference.columns)
+    assert loads(gdf.to_json())['features'][0]['properties']['NM'] == document['features'][0]['properties']['NM']
+
+@pytest.mark.parametrize('censo, nivel, columns, include_fields', [
+    # o fiona só aceita include_fields nos formatos de IGNORE_FIELDS_FORMATS
+    (Censo.CENSO_2010, Nivel.DISTRITOS, ['CD_GEOCODD'], True),
+    (Censo.CENSO_2022, Nivel.DISTRITOS, ['CD_DIST'], False),
+])
+def test_selecao_de_colunas_decidida_pelo_formato(server, cache_dir, monkeypatch, censo, nivel, columns, include_fields):
+    calls = []
+
+    def spy(*args, **kwargs):
+        calls.append(kwargs)
+        return read_file(*args, **kwargs)
+
+    monkeypatch.setattr(geopandas, 'read_file', spy)
+    # a cláusula where impede a leitura em fluxo do GeoJSON e passa pela leitura do OGR
+    gdf = download_malha(censo, nivel, cache_dir=cache_dir, cache_parquet=False, where='1 = 1', columns=columns)
+
+    assert list(gdf.columns) == columns + [gdf.geometry.name]
+    assert len(gdf) > 0
+    assert [('include_fields' in kwargs) for kwargs in calls if kwargs.get('rows') != 0] == [include_fields]
+
+def test_selecao_de_colunas_sem_formato_le_todos_os_campos(tmp_path):
+    path = tmp_path / 'malha.json'
+    path.write_text(dumps(feature_collection(None)))
+
+    gdf = read_vector(str(path), ['NM'])
+
+    assert list(gdf.columns) == ['NM', 'geometry']
+    assert len(gdf) == 25
+
+def test_copia_geoparquet_da_malha(server, cache_dir, metrics):
+    first = download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir, crs=4674)
+    second = download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir, crs=4674)
+    # outros parâmetros de leitura geram outra cópia
+    download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir, crs=31983)
+    # um novo arquivo de origem invalida as cópias anteriores
+    server.set_scale(2)
+    third = download_malha(Censo.CENSO_2010, Nivel.SETORES, cache_dir=cache_dir, crs=4674, revalidate=True)
+
+    assert_geodataframe_equal(second, first)
+    assert second.crs.to_epsg() == 4674
+    assert len(third) > len(first)
+    assert [e['status'] for e in metrics.events if e['event'] == 'derived_cache'] == ['miss', 'hit', 'miss', 'miss']
+    assert [e['source'] for e in metrics.events if e['event'] == 'parse'] == ['original', 'parquet', 'original', 'original']
@@ -0,0 +1,65 @@
+from os.path import join
+from time import sleep
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+
+import pytest
+
+from utils.downloads import (
+    Censo,
+    CircuitOpenError,
+    Nivel,
+    RetryConfig,
+    download_file,
+    get_circuit_breaker,
+    get_malha_url,
+    set_retry_config,
+)
+from utils.local_server import Faults
+
+SETORES = get_malha_url(Censo.CENSO_2010, Nivel.SETORES)
+DISTRITOS = get_malha_url(Censo.CENSO_2010, Nivel.DISTRITOS)
+
+def test_erros_transitorios_sao_repetidos(server, cache_dir):
+    set_retry_config(RetryConfig(attempts=50, wait_initial=0.01, wait_max=0.01, failure_threshold=100))
+    server.faults = Faults(error_rate=0.9, truncate_rate=0.5)
+
+    path = download_file(SETORES, join(cache_dir, 'malhas'), cache_dir=cache_dir)
+
+    assert server.requests[503] > 0
+    assert get_circuit_breaker(urlparse(SETORES).netloc).failures == 0
+    parsed = urlparse(SETORES)
+    archive, _ = server.archive(f'/{parsed.netloc}{parsed.path}')
+    with open(path, 'rb') as f:
+        assert f.read() == archive.content
+
+def test_erro_permanente_nao_e_repetido(server, cache_dir):
+    url = SETORES.replace('sp_setores_censitarios.zip', 'inexistente.zip')
+    with pytest.raises(HTTPError) as error:
+        download_file(url, join(cache_dir, 'malhas'), cache_dir=cache_dir)
+
+    assert error.value.code == 404
+    assert server.requests[404] == 1
+
+def test_disjuntor_suspende_o_servidor(server, cache_dir):
+    set_retry_config(RetryConfig(attempts=10, wait_initial=0.01, wait_max=0.01, failure_threshold=3, reset_timeout=0.5))
+    server.faults = Faults(error_rate=1)
+    file_dir = join(cache_dir, 'malhas')
+
+    # o disjuntor abre na terceira falha e interrompe as tentativas restantes
+    with pytest.raises(CircuitOpenError):
+        download_file(SETORES, file_dir, cache_dir=cache_dir)
+    assert server.requests[503] == 3
+
+    # outro arquivo do mesmo servidor falha sem nenhuma requisição
+    with pytest.raises(CircuitOpenError):
+        download_file(DISTRITOS, file_dir, cache_dir=cache_dir)
+    assert server.requests[503] == 3
+
+    # passado reset_timeout, uma requisição de teste é liberada e, com sucesso, fecha o disjuntor
+    server.faults = Faults()
+    sleep(0.6)
+    download_file(DISTRITOS, file_dir, cache_dir=cache_dir)
+    breaker = get_circuit_breaker(urlparse(DISTRITOS).netloc)
+    assert breaker.failures == 0
+    assert breaker.opened_at is None
@@ -1,33 +1,112 @@
+from __future__ import annotations
+
 from enum import Enum
-from geopandas import (
-    read_file,
-    GeoDataFrame,
-)
-from pandas import (
-    DataFrame,
-    read_excel,
-)
 from logging import (
+    INFO,
     Logger,
+    basicConfig,
     getLogger,
 )
 from os.path import (
+    abspath,
     exists,
+    getmtime,
+    getsize,
+    dirname,
+    isdir,
+    isfile,
     join,
     basename,
 )
 from os import (
+    O_CREAT,
+    O_RDWR,
+    close as os_close,
+    listdir,
     makedirs,
-    rename,
+    name as os_name,
+    open as os_open,
+    remove,
+    replace,
+    walk,
+)
+from json import (
+    JSONDecodeError,
+    JSONDecoder,
+    dump,
+    dumps,
+    load,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+import hashlib
+from re import (
+    findall,
+    fullmatch,
+    sub,
+)
+from urllib.error import (
+    ContentTooShortError,
+    HTTPError,
+)
+from urllib.parse import (
+    quote,
+    unquote,
+    urljoin,
+    urlparse,
 )
-from urllib.parse import urlparse
-from urllib.request import (
-    build_opener,
-    install_opener,
-    urlretrieve,
+from contextlib import (
+    ExitStack,
+    contextmanager,
+    nullcontext,
+)
+from socket import gaierror
+from time import (
+    monotonic,
+    perf_counter,
+    sleep,
+    time,
+)
+from collections import (
+    Counter,
+    deque,
 )
-from http.client import HTTPMessage
 from zipfile import ZipFile
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from threading import (
+    BoundedSemaphore,
+    RLock,
+)
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    NamedTuple,
+)
+from io import (
+    BytesIO,
+    TextIOWrapper,
+)
+
+# geopandas, pandas, http.client e multiprocessing só são importados pelas funções que os
+# utilizam, para que o uso de Censo, Nivel, UrlBuilder e das funções de URL não pague o custo
+# de importá-los
+if TYPE_CHECKING:
+    from geopandas import GeoDataFrame
+    from http.client import (
+        HTTPMessage,
+        HTTPResponse,
+    )
+    from pandas import (
+        DataFrame,
+        Series,
+    )
 
 class Censo(Enum):
    CENSO_2000:int=2000
@@ -38,10 +117,160 @@ class Nivel(Enum):
    DISTRITOS:str='distritos'
    SETORES:str='setores'
 
+class Variavel(NamedTuple):
+   """Nome semântico e tipo de uma variável das planilhas do censo."""
+   nome: str
+   dtype: str
+
+class RetryConfig(NamedTuple):
+   """Parâmetros das novas tentativas e dos disjuntores aplicados às operações de rede."""
+   attempts: int = 5
+   wait_initial: float = 1
+   wait_max: float = 30
+   failure_threshold: int = 5
+   reset_timeout: float = 60
+
 GEOSAMPA_DOMAIN = 'http://download.geosampa.prefeitura.sp.gov.br/'
 NAMESPACE = 'PaginasPublicas/'
 ENDPOINT = 'downloadArquivo.aspx'
 
+class Dataset(NamedTuple):
+   """
+   Entrada do catálogo de arquivos do IBGE.
+
+   format é o formato do conteúdo do zip ('shapefile', 'geojson' ou 'excel'); member é o caminho de uma
+   planilha dentro do zip, com {arquivo} no lugar do nome; encoding é a codificação dos nomes dos membros
+   quando o zip não a declara; crs substitui o sistema de coordenadas declarado na malha, quando este
+   está incorreto; municipio é a cláusula WHERE (dialeto SQL do OGR) que seleciona as feições de um
+   município; key é a coluna que identifica cada setor ou distrito; schema traz as variáveis conhecidas
+   de cada planilha, indexadas pelo nome da planilha em maiúsculas; suprimido é o marcador com que o
+   IBGE substitui, em qualquer variável das planilhas, os valores suprimidos.
+   """
+   url: str
+   format: str
+   key: str
+   member: str = None
+   encoding: str = None
+   crs: str = None
+   municipio: str = None
+   schema: dict = None
+   suprimido: str = None
+
+IBGE_MALHAS = 'https://geoftp.ibge.gov.br/organizacao_do_territorio/malhas_territoriais/malhas_de_setores_censitarios__divisoes_intramunicipais/'
+IBGE_CENSOS = 'https://ftp.ibge.gov.br/Censos/'
+
+# arquivos conhecidos, indexados por tipo ('malha' ou 'dados'), censo e nível geográfico.
+# nas planilhas, os tipos são anuláveis para acomodar os valores suprimidos pelo IBGE; a renda usa
+# Float64 porque float32 não representa com exatidão os totais de rendimento de um setor. As variáveis
+# que não estão no schema também são lidas com um tipo anulável (ver VARIAVEL_PATTERN)
+CATALOGO = {
+    ('malha', Censo.CENSO_2000, Nivel.SETORES): Dataset(
+        url=f'{IBGE_MALHAS}censo_2000/setor_urbano/sp/3550308/3550308.zip',
+        format='shapefile',
+        key='ID_',
+        crs='EPSG:31983',
+        municipio="ID_ LIKE '{}%'",
+    ),
+    ('malha', Censo.CENSO_2010, Nivel.SETORES): Dataset(
+        url=f'{IBGE_MALHAS}censo_2010/setores_censitarios_shp/sp/sp_setores_censitarios.zip',
+        format='shapefile',
+        key='CD_GEOCODI',
+        municipio="CD_GEOCODM = '{}'",
+    ),
+    ('malha', Censo.CENSO_2010, Nivel.DISTRITOS): Dataset(
+        url=f'{IBGE_MALHAS}censo_2010/setores_censitarios_shp/sp/sp_distritos.zip',
+        format='shapefile',
+        key='CD_GEOCODD',
+        municipio="CD_GEOCODD LIKE '{}%'",
+    ),
+    ('malha', Censo.CENSO_2022, Nivel.SETORES): Dataset(
+        url=f'{IBGE_CENSOS}Censo_Demografico_2022/Agregados_por_Setores_Censitarios_preliminares/malha_com_atributos/setores/json/UF/SP/SP_Malha_Preliminar_2022.zip',
+        format='geojson',
+        key='CD_SETOR',
+        municipio="CD_MUN = '{}'",
+    ),
+    ('malha', Censo.CENSO_2022, Nivel.DISTRITOS): Dataset(
+        url=f'{IBGE_CENSOS}Censo_Demografico_2022/Agregados_por_Setores_Censitarios_preliminares/malha_com_atributos/distritos/json/UF/SP/SP_Malha_Preliminar_Distrito_2022.zip',
+        format='geojson',
+        key='CD_DIST',
+        municipio="CD_MUN = '{}'",
+    ),
+    ('dados', Censo.CENSO_2000, Nivel.SETORES): Dataset(
+        url=f'{IBGE_CENSOS}Censo_Demografico_2000/Dados_do_Universo/Agregado_por_Setores_Censitarios/Agregado_de_setores_2000_SP_RM.zip',
+        format='excel',
+        key='Cod_setor',
+        member='São Paulo1/{arquivo}',
+        encoding='IBM850',
+        schema={
+            'MORADOR_SP1.XLS': {
+                'V0237': Variavel('pop_total', 'Int32'),
+            },
+            'DOMICILIO_SP1.XLS': {
+                'V0001': Variavel('dom_total', 'Int32'),
+            },
+        },
+    ),
+    ('dados', Censo.CENSO_2010, Nivel.SETORES): Dataset(
+        url=f'{IBGE_CENSOS}Censo_Demografico_2010/Resultados_do_Universo/Agregados_por_Setores_Censitarios/SP_Capital_20231030.zip',
+        format='excel',
+        key='Cod_setor',
+        member='Base informaçoes setores2010 universo SP_Capital/EXCEL/{arquivo}',
+        suprimido='X',
+        schema={
+            'DOMICILIO01_SP1.XLS': {
+                'V001': Variavel('dom_total', 'Int32'),
+            },
+            'DOMICILIO02_SP1.XLS': {
+                'V001': Variavel('pop_total', 'Int32'),
+            },
+            'DOMICILIORENDA_SP1.XLS': {
+                'V002': Variavel('rend_total', 'Float64'),
+            },
+        },
+    ),
+}
+
+# variáveis das planilhas (V001, V0237, ...); as que não estão no schema do catálogo são convertidas
+# para o menor tipo numérico anulável que as representa (Int32, Int64 ou Float64)
+VARIAVEL_PATTERN = r'V\d+'
+
+# formatos (Dataset.format) cujos drivers do OGR permitem ignorar campos na leitura; o fiona só
+# aceita include_fields nesses drivers, enquanto o pyogrio seleciona as colunas em qualquer um
+IGNORE_FIELDS_FORMATS = {'shapefile'}
+
+MANIFEST_FILENAME = 'manifest.json'
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = '.part'
+LOCK_SUFFIX = '.lock'
+# lock compartilhado mantido enquanto um arquivo do cache é lido; a remoção pelo limite do
+# cache precisa dele em modo exclusivo e, portanto, não remove um arquivo em uso
+USE_SUFFIX = '.use'
+# tamanho máximo do cache local, em bytes; None desativa a remoção automática
+CACHE_MAX_BYTES = None
+
+# raiz de um espelho (diretório local ou servidor HTTP) para onde as URLs são redirecionadas,
+# e modo offline, em que apenas o cache local é consultado
+MIRROR_ROOT = None
+OFFLINE = False
+
+# serializa as atualizações dos manifestos entre threads do mesmo processo
+MANIFEST_LOCK = RLock()
+
+USER_AGENT = 'compatibilizacao-setores-censitarios'
+
+# política de novas tentativas (ver set_retry_config) e disjuntores por servidor (ver get_circuit_breaker)
+RETRY_CONFIG = RetryConfig()
+BREAKERS = {}
+BREAKERS_LOCK = RLock()
+
+# sessão HTTP compartilhada, criada na primeira requisição (ver get_session)
+SESSION = None
+SESSION_LOCK = RLock()
+
+# operações em andamento compartilhadas por chamadas simultâneas (ver __single_flight)
+FLIGHTS = {}
+FLIGHTS_LOCK = RLock()
+
 class UrlBuilder:
     '''Builds url for shapefiles request.'''
 
@@ -83,156 +312,2491 @@ class UrlBuilder:
 
         return self.build_url(namespace, endpoint, **params)
 
-def __prepare_cache(url:str, file_dir:str, logger:Logger=getLogger()) -> str:
+class FileLock:
+    """
+    Lock exclusivo entre processos baseado em um arquivo (flock no POSIX, msvcrt.locking no Windows).
 
-    filename = __get_url_filename(url)
-    file_path = join(file_dir, filename)
+    Protege uma entrada do cache compartilhado: enquanto um processo baixa ou converte um
+    arquivo, os demais que precisam do mesmo arquivo esperam o lock e, ao obtê-lo, encontram
+    o resultado pronto. O arquivo de lock não é removido ao final.
 
-    if not exists(file_path):
-        logger.info(f'Baixando o arquivo {filename} de {url}.')
-        makedirs(file_dir, exist_ok=True)
-        urlretrieve(url, file_path)
-    else:
-        logger.info(f'O arquivo {file_path} já foi baixado anteriormente. Usando cache local.')
+    Com shared=True, o lock pode ser mantido por vários processos ao mesmo tempo e impede
+    apenas o lock exclusivo. O Windows não tem locks compartilhados: lá, shared=True é
+    equivalente a um lock exclusivo.
+    """
 
-    return file_path
+    def __init__(self, path:str, timeout:float=None, poll_interval:float=0.1, logger:Logger=None, shared:bool=False):
 
-def __get_url_filename(url:str) -> str:
-    opener = build_opener()
-    opener.addheaders = [('Range', '0-0')]
-    install_opener(opener)
+        self.path = path
+        self.shared = shared
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self._fd = None
 
-    fpath, headers = urlretrieve(url)
+    def _try_lock(self) -> bool:
 
-    if __get_atachment_filename(headers):
-        return __get_atachment_filename(headers)
-    
-    parsed_url = urlparse(url)
-    return basename(parsed_url.path)
+        try:
+            if os_name == 'nt':
+                import msvcrt
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
 
-def __get_atachment_filename(headers:HTTPMessage) -> str:
-    if 'Content-Disposition' in headers:
-        cdisp = headers.get('Content-Disposition')
-        if 'filename' in cdisp:
-            return cdisp.split('filename=')[1].replace('"', '')
+    def acquire(self) -> None:
 
-def get_shapefile_url(filename:str) -> str:
-    build_url = UrlBuilder(GEOSAMPA_DOMAIN)
-    url = build_url(
-        namespace=NAMESPACE,
-        endpoint=ENDPOINT,
-        orig='DownloadCamadas',
-        arq=filename,
-        arqTipo='Shapefile'
-    )
+        makedirs(dirname(self.path) or '.', exist_ok=True)
+        self._fd = os_open(self.path, O_RDWR | O_CREAT)
+        started = monotonic()
+        waiting = False
+        while not self._try_lock():
+            if not waiting and self.logger:
+                self.logger.info(f'Aguardando outro processo liberar {self.path}.')
+            waiting = True
+            if self.timeout is not None and monotonic() - started > self.timeout:
+                os_close(self._fd)
+                self._fd = None
+                raise TimeoutError(f'Tempo esgotado aguardando o lock {self.path}.')
+            sleep(self.poll_interval)
 
-    return url
+    def release(self) -> None:
 
-def get_malha_url(censo:Censo, nivel:Nivel) -> str:
+        if self._fd is None:
+            return
+        try:
+            if os_name == 'nt':
+                import msvcrt
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os_close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> FileLock:
+
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+
+        self.release()
+
+class HttpSession:
     """
-    Essa função retorna a url do arquivo georreferenciado de determinado nível geográfico do censo escolhido.
+    Sessão HTTP com conexões persistentes (keep-alive) reaproveitadas por servidor.
+
+    Cada conexão é usada por uma única thread de cada vez; as conexões ociosas ficam em um
+    pool por (esquema, servidor, porta), protegido por um lock, de modo que a mesma sessão
+    pode ser compartilhada por várias threads. Redirecionamentos são seguidos e os proxies
+    configurados no ambiente (http_proxy, https_proxy, no_proxy) são respeitados.
+    """
+
+    REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout:float=60, max_idle_per_host:int=4, max_redirects:int=10, headers:dict=None):
+
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.headers = {'User-Agent': USER_AGENT, **(headers or {})}
+        self._pools = {}
+        self._lock = RLock()
+
+    def _pool_key(self, url:str) -> tuple:
+
+        from urllib.request import (
+            getproxies,
+            proxy_bypass,
+        )
+
+        parsed = urlparse(url)
+        proxy = getproxies().get(parsed.scheme)
+        if proxy and proxy_bypass(parsed.hostname):
+            proxy = None
+
+        return (parsed.scheme, parsed.hostname, parsed.port, proxy)
+
+    def _connect(self, key:tuple):
+
+        from http.client import (
+            HTTPConnection,
+            HTTPSConnection,
+        )
+
+        scheme, host, port, proxy = key
+        if proxy:
+            parsed_proxy = urlparse(proxy)
+            if scheme == 'https':
+                conn = HTTPSConnection(parsed_proxy.hostname, parsed_proxy.port, timeout=self.timeout)
+                conn.set_tunnel(host, port)
+            else:
+                conn = HTTPConnection(parsed_proxy.hostname, parsed_proxy.port, timeout=self.timeout)
+            return conn
+
+        if scheme == 'https':
+            return HTTPSConnection(host, port, timeout=self.timeout)
+        return HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, key:tuple):
+
+        with self._lock:
+            idle = self._pools.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _release(self, key:tuple, conn) -> None:
+
+        with self._lock:
+            idle = self._pools.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method:str, url:str, headers:dict) -> tuple:
+
+        from http.client import (
+            BadStatusLine,
+            RemoteDisconnected,
+        )
+
+        key = self._pool_key(url)
+        parsed = urlparse(url)
+        if key[3] and parsed.scheme == 'http':
+            # requisições HTTP via proxy usam a URL absoluta
+            target = url
+        else:
+            target = parsed.path or '/'
+            if parsed.query:
+                target = f'{target}?{parsed.query}'
+
+        conn, reused = self._acquire(key)
+        try:
+            conn.request(method, target, headers={**self.headers, **headers})
+            return key, conn, conn.getresponse()
+        except (BadStatusLine, RemoteDisconnected, ConnectionError):
+            conn.close()
+            if not reused:
+                raise
+        # o servidor fechou a conexão ociosa; tenta de novo em uma conexão nova
+        conn = self._connect(key)
+        try:
+            conn.request(method, target, headers={**self.headers, **headers})
+            return key, conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    @contextmanager
+    def request(self, method:str, url:str, headers:dict=None):
+        """
+        Envia a requisição e devolve a resposta (http.client.HTTPResponse, com o atributo url
+        indicando o endereço final depois dos redirecionamentos) como gerenciador de contexto.
+
+        Respostas fora da faixa 2xx levantam urllib.error.HTTPError, como em urllib.request.urlopen.
+        Ao sair do contexto, a conexão volta ao pool se o corpo da resposta foi lido por inteiro,
+        ou é fechada caso contrário.
+        """
+        headers = headers or {}
+
+        for _ in range(self.max_redirects + 1):
+            key, conn, response = self._send(method, url, headers)
+            response.url = url
+
+            if response.status in self.REDIRECT_CODES and response.getheader('Location'):
+                response.read()
+                self._finish(key, conn, response)
+                url = urljoin(url, response.getheader('Location'))
+                if response.status == 303 and method != 'HEAD':
+                    method = 'GET'
+                continue
+
+            if not 200 <= response.status < 300:
+                response.read()
+                self._finish(key, conn, response)
+                raise HTTPError(url, response.status, response.reason, response.headers, None)
+
+            if method == 'HEAD':
+                # a resposta a um HEAD não tem corpo; lê-la libera a conexão para o pool
+                response.read()
+
+            try:
+                yield response
+            finally:
+                self._finish(key, conn, response)
+            return
+
+        raise HTTPError(url, response.status, 'Redirecionamentos em excesso', response.headers, None)
+
+    def _finish(self, key:tuple, conn, response) -> None:
+
+        if response.isclosed() and not response.will_close:
+            self._release(key, conn)
+        else:
+            conn.close()
+
+    def close(self) -> None:
+        """Fecha todas as conexões ociosas."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+def get_session() -> HttpSession:
+    """
+    Devolve a sessão HTTP compartilhada por todas as funções de download deste módulo.
+    """
+    global SESSION
+    with SESSION_LOCK:
+        if SESSION is None:
+            SESSION = HttpSession()
+        return SESSION
+
+def set_session(session:HttpSession) -> None:
+    """
+    Substitui a sessão HTTP compartilhada (por exemplo, para alterar o timeout ou os cabeçalhos).
+    """
+    global SESSION
+    with SESSION_LOCK:
+        SESSION = session
+
+class OfflineError(ConnectionError):
+    """Levantada quando o modo offline está ativo e o arquivo pedido não está no cache local."""
+
+def set_mirror(root:str|None) -> None:
+    """
+    Define um espelho para os downloads: um servidor HTTP (http://host:porta/) ou um diretório
+    local (caminho ou file://). None volta a usar os servidores originais.
+
+    O espelho reproduz os servidores originais sob um subdiretório por host: a URL
+    https://ftp.ibge.gov.br/Censos/x.zip é buscada em <raiz>/ftp.ibge.gov.br/Censos/x.zip.
+    Em um diretório local, uma URL com parâmetros corresponde a um diretório
+    <raiz>/<host>/<caminho>/<parâmetros>/ contendo um único arquivo, cujo nome é o nome do
+    arquivo servido. O nome do diretório é a query string decodificada como latin-1 e
+    codificada de novo com urllib.parse.quote(..., safe=''), de modo que só contém letras,
+    dígitos, _.-~ e sequências %XX: a URL downloadArquivo.aspx?orig=DownloadCamadas&arq=a%5Cb%E7
+    corresponde ao diretório orig%3DDownloadCamadas%26arq%3Da%5Cb%C3%A7. O manifesto e o cache
+    continuam indexados pela URL original.
+    """
+    global MIRROR_ROOT
+    MIRROR_ROOT = root
+
+def set_offline(enabled:bool) -> None:
+    """
+    Ativa ou desativa o modo offline. Nele, nenhuma requisição de rede é feita: arquivos em
+    cache são usados sem revalidação e a falta de um arquivo levanta OfflineError.
+    """
+    global OFFLINE
+    OFFLINE = enabled
+
+def __mirror_url(url:str) -> str:
+    if MIRROR_ROOT is None or __local_mirror_root() is not None:
+        return url
+    parsed = urlparse(url)
+    mirrored = f'{MIRROR_ROOT.rstrip("/")}/{parsed.netloc}{parsed.path}'
+    if parsed.query:
+        mirrored = f'{mirrored}?{parsed.query}'
+    return mirrored
+
+def __local_mirror_root() -> str|None:
+    if MIRROR_ROOT is None or urlparse(MIRROR_ROOT).scheme in ('http', 'https'):
+        return None
+    if MIRROR_ROOT.startswith('file://'):
+        from urllib.request import url2pathname
+        return url2pathname(urlparse(MIRROR_ROOT).path)
+    return MIRROR_ROOT
+
+def __local_mirror_path(url:str) -> str:
+    parsed = urlparse(url)
+    path = join(__local_mirror_root(), parsed.netloc, *unquote(parsed.path).strip('/').split('/'))
+    if parsed.query:
+        # os parâmetros são decodificados como latin-1, a codificação das URLs do GeoSampa, e
+        # codificados de novo por completo, para que \, &, = e : não cheguem ao nome do diretório
+        path = join(path, quote(unquote(parsed.query, encoding='latin-1'), safe=''))
+
+    if isdir(path):
+        files = [name for name in listdir(path) if isfile(join(path, name))]
+        if len(files) != 1:
+            raise FileNotFoundError(f'O diretório {path} do espelho deveria conter exatamente um arquivo para {url}.')
+        path = join(path, files[0])
+    if not isfile(path):
+        raise FileNotFoundError(f'O arquivo de {url} não foi encontrado no espelho ({path}).')
+
+    return path
+
+def __copy_from_mirror(url:str, file_path:str, headers:dict) -> dict|None:
+    """
+    Copia o arquivo da URL do espelho local para o arquivo parcial (.part) de file_path.
+
+    Devolve os campos do manifesto do arquivo copiado, ou None se a data de modificação no
+    espelho for a mesma registrada no manifesto (If-Modified-Since em headers).
+    """
+    from email.utils import formatdate
+
+    source = __local_mirror_path(url)
+    last_modified = formatdate(getmtime(source), usegmt=True)
+    if headers.get('If-Modified-Since') == last_modified:
+        return None
+
+    started = perf_counter()
+    sha256 = hashlib.sha256()
+    size = 0
+    makedirs(dirname(file_path) or '.', exist_ok=True)
+    with open(source, 'rb') as src, open(f'{file_path}{PART_SUFFIX}', 'wb') as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            dst.write(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+
+    __emit('download', url=url, status=200, bytes=size, seconds=perf_counter() - started, ttfb=None)
+
+    return {
+        'sha256': sha256.hexdigest(),
+        'size': size,
+        'etag': None,
+        'last_modified': last_modified,
+    }
+
+def __prepare_cache(url:str, file_dir:str, logger:Logger=getLogger(), revalidate:bool=False, verify:bool=False, cache_dir:str=None, hold:ExitStack=None) -> str:
+    """
+    Garante que o arquivo da URL esteja no diretório de cache e devolve o seu caminho local.
+
+    Cada arquivo baixado é registrado no manifesto do diretório com o seu tamanho, hash sha256,
+    ETag, Last-Modified e data de download. Um arquivo em cache cujo tamanho (ou hash, quando
+    verify=True) não confere com o manifesto é descartado e baixado novamente.
+
+    O download respeita o espelho definido em set_mirror e, no modo offline (set_offline),
+    um arquivo ausente do cache levanta OfflineError sem acessar a rede.
 
     Parameters
     ----------
-    censo : Censo
-        O censo de referência.
-    nivel : Nivel
-        O nível geográfico da malha desejada.
+    url : str
+        A URL do arquivo.
+    file_dir : str
+        O diretório de cache.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    revalidate : bool
+        Se True, consulta o servidor com If-None-Match/If-Modified-Since e só baixa o arquivo novamente caso ele tenha sido alterado.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho.
+    cache_dir : str
+        O diretório raiz do cache, sobre o qual é aplicado o limite CACHE_MAX_BYTES após um
+        download. Caso não seja fornecido, o limite é aplicado apenas a file_dir.
+    hold : ExitStack
+        Se fornecido, recebe o lock de uso do arquivo: até que hold seja fechado, o arquivo não
+        é removido pelo limite do cache.
 
     Returns
     -------
     str
-        A URL do arquivo georreferenciado escolhido.
+        O caminho do arquivo no cache local.
     """
-    nivel_str = nivel.value
-    if censo == Censo.CENSO_2000:
-        if nivel == Nivel.SETORES:
-            return f'https://geoftp.ibge.gov.br/organizacao_do_territorio/malhas_territoriais/malhas_de_setores_censitarios__divisoes_intramunicipais/censo_2000/setor_urbano/sp/3550308/3550308.zip'
-    
-    if censo == Censo.CENSO_2010:
-        if nivel == Nivel.SETORES:
-            nivel_str ='setores_censitarios'
-        return f'https://geoftp.ibge.gov.br/organizacao_do_territorio/malhas_territoriais/malhas_de_setores_censitarios__divisoes_intramunicipais/censo_2010/setores_censitarios_shp/sp/sp_{nivel_str}.zip'
-    
-    if censo == Censo.CENSO_2022:
-        if nivel == Nivel.DISTRITOS:
-            sufixo = '_Distrito'
-        elif nivel == Nivel.SETORES:
-            sufixo = ''
-        return f'https://ftp.ibge.gov.br/Censos/Censo_Demografico_2022/Agregados_por_Setores_Censitarios_preliminares/malha_com_atributos/{nivel_str}/json/UF/SP/SP_Malha_Preliminar{sufixo}_2022.zip'
+    filename = __get_url_filename(url, file_dir)
+    file_path = join(file_dir, filename)
+    # o lock garante que processos diferentes não baixem o mesmo arquivo ao mesmo tempo;
+    # quem espera encontra o arquivo já baixado ao conseguir o lock
+    with FileLock(f'{file_path}{LOCK_SUFFIX}', logger=logger):
+        if hold is not None:
+            # adquirido antes de liberar o lock do download, para que o arquivo não seja
+            # removido entre a verificação e a leitura
+            hold.enter_context(FileLock(f'{file_path}{USE_SUFFIX}', logger=logger, shared=True))
+        entry = __read_manifest(file_dir).get(url, {})
 
-def download_malha(censo:Censo, nivel:Nivel, filtro:str=None, logger:Logger=getLogger(), cache_dir:str='data/cache/', **kwargs) -> GeoDataFrame:
+        headers = {}
+        if exists(file_path) and __is_cache_valid(url, file_dir, file_path, entry, verify, logger):
+            if not revalidate or OFFLINE:
+                logger.info(f'O arquivo {file_path} já foi baixado anteriormente. Usando cache local.')
+                __emit('cache', status='hit', url=url)
+                __update_manifest(file_dir, url, last_access=__now())
+                return file_path
+            entry = __read_manifest(file_dir).get(url, {})
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            logger.info(f'Revalidando o arquivo {file_path} em {url}.')
+            __emit('cache', status='revalidate', url=url)
+        elif OFFLINE:
+            __emit('cache', status='offline_miss', url=url)
+            raise OfflineError(f'Modo offline: o arquivo {file_path} de {url} não está no cache local.')
+        else:
+            logger.info(f'Baixando o arquivo {filename} de {url}.')
+            __emit('cache', status='miss', url=url)
+
+        if __local_mirror_root() is not None:
+            fields = __copy_from_mirror(url, file_path, headers)
+        else:
+            fields = __with_retry(__mirror_url(url), lambda: __fetch(url, file_dir, file_path, headers, logger), logger)
+        if fields is None:
+            logger.info(f'O arquivo {file_path} não foi alterado no servidor. Usando cache local.')
+            __emit('cache', status='not_modified', url=url)
+            __update_manifest(file_dir, url, fetched_at=__now(), last_access=__now())
+            return file_path
+
+        replace(f'{file_path}{PART_SUFFIX}', file_path)
+        __update_manifest(
+            file_dir,
+            url,
+            filename=filename,
+            fetched_at=__now(),
+            last_access=__now(),
+            partial=None,
+            **fields,
+        )
+
+    __enforce_cache_budget(cache_dir or file_dir, logger, keep=[file_path])
+    return file_path
+
+def __fetch(url:str, file_dir:str, file_path:str, headers:dict, logger:Logger) -> dict|None:
     """
-    Baixa a malha no nível especificado para o censo escolhido. Os parâmetros enviados via kwargs são enviados ao método read_file do Geopandas.
+    Baixa a URL para o arquivo parcial (.part) de file_path.
 
-    O parâmetro filtro pode ser passado como uma string que será utilizado como filtro para o método GeoDataFrame.query.
+    Devolve os campos do manifesto do arquivo baixado, ou None se o servidor responder que
+    o arquivo não foi alterado (304) aos cabeçalhos condicionais em headers.
+    """
+    # um download interrompido anteriormente é retomado a partir do ponto em que parou,
+    # desde que o servidor confirme (If-Range) que o arquivo não mudou nesse meio tempo
+    part_path = f'{file_path}{PART_SUFFIX}'
+    partial = __read_manifest(file_dir).get(url, {}).get('partial', {})
+    validator = partial.get('etag') or partial.get('last_modified')
+    if exists(part_path) and getsize(part_path) > 0 and validator:
+        logger.info(f'Retomando o download de {basename(file_path)} a partir do byte {getsize(part_path)}.')
+        headers = {
+            'Range': f'bytes={getsize(part_path)}-',
+            'If-Range': validator,
+        }
 
-    O parâmetro logger pode ser passado como uma instância de Logger para a utilização de um Logger diferente do padrão.
+    session = get_session()
+    source = __mirror_url(url)
+    started = perf_counter()
+    try:
+        with session.request('GET', source, headers=headers) as response:
+            if response.status != 206 or __content_range(response)[0] == getsize(part_path):
+                return __download_part(response, url, file_dir, part_path, started)
+            logger.warning(f'O trecho enviado pelo servidor não continua o download parcial de {basename(file_path)}. Recomeçando do zero.')
+    except HTTPError as e:
+        if e.code == 304:
+            return None
+        if e.code != 416:
+            raise
+    # o trecho já baixado não é compatível com o arquivo remoto: recomeça do zero
+    if exists(part_path):
+        remove(part_path)
+    started = perf_counter()
+    with session.request('GET', source) as response:
+        return __download_part(response, url, file_dir, part_path, started)
+
+class MetricsCollector:
+    """
+    Coletor padrão de métricas: acumula em memória os eventos emitidos pelas funções deste módulo.
+
+    Qualquer função com a assinatura collector(event, **fields) pode substituí-lo via
+    set_metrics_collector. Os eventos emitidos são:
+
+    - 'cache': status ('hit', 'miss', 'revalidate', 'not_modified' ou 'offline_miss') e url do
+      arquivo baixado, ou status 'evicted' e count de arquivos removidos pelo limite do cache;
+    - 'derived_cache': status ('hit' ou 'miss') e path de uma cópia Parquet/GeoParquet;
+    - 'download': url, status HTTP, bytes transferidos, seconds de duração e ttfb (tempo até o primeiro byte);
+    - 'parse': dataset, source ('original' ou 'parquet') e seconds de leitura;
+    - 'coalesced': key de uma chamada atendida pelo resultado de outra chamada simultânea.
+    """
+
+    def __init__(self, max_events:int=10000):
+
+        self.events = deque(maxlen=max_events)
+        self._lock = RLock()
+
+    def __call__(self, event:str, **fields) -> None:
+
+        with self._lock:
+            self.events.append({'event': event, 'time': time(), **fields})
+
+    def reset(self) -> None:
+
+        with self._lock:
+            self.events.clear()
+
+    def summary(self) -> dict:
+        """
+        Resume os eventos acumulados: contagens de cache, volume, vazão e tempo até o primeiro
+        byte dos downloads e tempo de leitura por dataset.
+        """
+        with self._lock:
+            events = list(self.events)
+
+        summary = {
+            'cache': Counter(e['status'] for e in events if e['event'] == 'cache'),
+            'derived_cache': Counter(e['status'] for e in events if e['event'] == 'derived_cache'),
+            'downloads': 0,
+            'bytes': 0,
+            'seconds': 0.0,
+            'throughput': None,
+            'ttfb_mean': None,
+            'parse': {},
+            'coalesced': sum(1 for e in events if e['event'] == 'coalesced'),
+        }
+
+        downloads = [e for e in events if e['event'] == 'download']
+        ttfbs = [e['ttfb'] for e in downloads if e['ttfb'] is not None]
+        summary['downloads'] = len(downloads)
+        summary['bytes'] = sum(e['bytes'] for e in downloads)
+        summary['seconds'] = sum(e['seconds'] for e in downloads)
+        if summary['seconds']:
+            summary['throughput'] = summary['bytes'] / summary['seconds']
+        if ttfbs:
+            summary['ttfb_mean'] = sum(ttfbs) / len(ttfbs)
+
+        for e in events:
+            if e['event'] == 'parse':
+                key = (e['dataset'], e['source'])
+                parse = summary['parse'].setdefault(key, {'count': 0, 'seconds': 0.0})
+                parse['count'] += 1
+                parse['seconds'] += e['seconds']
+
+        return summary
+
+# coletor que recebe os eventos de __emit (ver set_metrics_collector)
+METRICS_COLLECTOR = MetricsCollector()
+
+def get_metrics_collector() -> Callable:
+    """
+    Devolve o coletor de métricas em uso. Por padrão, um MetricsCollector em memória.
+    """
+    return METRICS_COLLECTOR
+
+def set_metrics_collector(collector:Callable) -> None:
+    """
+    Substitui o coletor de métricas. O coletor recebe o nome do evento e os seus campos
+    como argumentos nomeados; None desativa a coleta.
+    """
+    global METRICS_COLLECTOR
+    METRICS_COLLECTOR = collector
+
+def __emit(event:str, **fields) -> None:
+    collector = METRICS_COLLECTOR
+    if collector is None:
+        return
+    try:
+        collector(event, **fields)
+    except Exception as e:
+        # uma falha na instrumentação nunca deve interromper o download
+        getLogger(__name__).warning(f'Falha no coletor de métricas ao registrar {event}: {e}')
+
+class CircuitOpenError(ConnectionError):
+    """Levantada quando um servidor acumulou falhas seguidas e as requisições a ele estão suspensas."""
+
+class CircuitBreaker:
+    """
+    Disjuntor de um servidor: depois de failure_threshold falhas seguidas, as requisições
+    falham imediatamente com CircuitOpenError durante reset_timeout segundos. Passado esse
+    tempo, uma requisição de teste é liberada; se ela funcionar, o disjuntor volta a fechar.
+    """
+
+    def __init__(self, host:str, failure_threshold:int=5, reset_timeout:float=60):
+
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = RLock()
+
+    def before_call(self) -> None:
+
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f'O servidor {self.host} está suspenso após {self.failures} falhas seguidas.'
+                )
+            # meio-aberto: libera esta chamada e adia as demais até o resultado dela
+            self.opened_at = monotonic()
+
+    def record_success(self) -> None:
+
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = monotonic()
+
+def set_retry_config(config:RetryConfig) -> None:
+    """
+    Altera a política de novas tentativas e de disjuntores. Os disjuntores existentes são descartados.
+    """
+    global RETRY_CONFIG
+    with BREAKERS_LOCK:
+        RETRY_CONFIG = config
+        BREAKERS.clear()
+
+def get_circuit_breaker(host:str) -> CircuitBreaker:
+    """
+    Devolve o disjuntor do servidor, criando-o na primeira chamada.
+    """
+    with BREAKERS_LOCK:
+        if host not in BREAKERS:
+            BREAKERS[host] = CircuitBreaker(
+                host,
+                failure_threshold=RETRY_CONFIG.failure_threshold,
+                reset_timeout=RETRY_CONFIG.reset_timeout,
+            )
+        return BREAKERS[host]
+
+def __is_transient(error:BaseException) -> bool:
+    """
+    Indica se o erro é transitório (falha de conexão, timeout ou erro 5xx/429 do servidor)
+    e, portanto, se vale tentar a operação novamente.
+    """
+    from http.client import HTTPException
+
+    if isinstance(error, (CircuitOpenError, OfflineError)):
+        return False
+    if isinstance(error, HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (ContentTooShortError, ConnectionError, TimeoutError, HTTPException, gaierror))
+
+def __with_retry(url:str, operation:Callable, logger:Logger=getLogger()):
+    """
+    Executa a operação de rede com novas tentativas em espera exponencial para erros transitórios,
+    passando antes pelo disjuntor do servidor da URL.
+    """
+    from tenacity import (
+        Retrying,
+        retry_if_exception,
+        stop_after_attempt,
+        wait_exponential,
+        wait_random,
+    )
+
+    config = RETRY_CONFIG
+    breaker = get_circuit_breaker(urlparse(url).netloc)
+
+    def attempt():
+        breaker.before_call()
+        try:
+            result = operation()
+        except BaseException as e:
+            if __is_transient(e):
+                breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    def log_retry(state):
+        logger.warning(
+            f'Falha ao acessar {url} ({state.outcome.exception()}). '
+            f'Tentando novamente em {state.next_action.sleep:.1f}s '
+            f'(tentativa {state.attempt_number + 1} de {config.attempts}).'
+        )
+
+    retrying = Retrying(
+        stop=stop_after_attempt(config.attempts),
+        wait=wait_exponential(multiplier=config.wait_initial, max=config.wait_max) + wait_random(0, config.wait_initial),
+        retry=retry_if_exception(__is_transient),
+        before_sleep=log_retry,
+        reraise=True,
+    )
+    return retrying(attempt)
+
+def __content_range(response:HTTPResponse) -> tuple[int, int]|tuple[None, None]:
+    """
+    Devolve o byte inicial e o tamanho total do arquivo informados no Content-Range de uma
+    resposta 206, ou (None, None) se o cabeçalho estiver ausente ou não informar ambos.
+    """
+    match = fullmatch(r'bytes\s+(\d+)-\d+/(\d+)', (response.headers.get('Content-Range') or '').strip())
+    if not match:
+        return None, None
+    return int(match.group(1)), int(match.group(2))
+
+def __download_part(response:HTTPResponse, url:str, file_dir:str, part_path:str, started:float) -> dict:
+    """
+    Grava o corpo da resposta no arquivo parcial (.part) em blocos de CHUNK_SIZE bytes.
+
+    Uma resposta 206, cujo Content-Range deve começar no fim do arquivo parcial, é anexada a
+    ele; qualquer outra resposta o sobrescreve. Os validadores da resposta são registrados no
+    manifesto antes da transferência, para que uma interrupção possa ser retomada na próxima
+    chamada. Um arquivo que termina maior que o tamanho anunciado pelo servidor é descartado.
+
+    started é o instante (perf_counter) em que a requisição foi enviada, a partir do qual são
+    medidos o tempo até o primeiro byte e a duração reportados na métrica 'download'.
+
+    Returns
+    -------
+    dict
+        O hash sha256, o tamanho, o ETag e o Last-Modified do arquivo completo.
+    """
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+
+    if response.status == 206:
+        mode = 'ab'
+        sha256 = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha256.update(chunk)
+        size = getsize(part_path)
+        expected = __content_range(response)[1]
+    else:
+        mode = 'wb'
+        sha256 = hashlib.sha256()
+        size = 0
+        content_length = response.headers.get('Content-Length')
+        expected = int(content_length) if content_length else None
+        __update_manifest(
+            file_dir,
+            url,
+            partial={'etag': etag, 'last_modified': last_modified},
+        )
+
+    makedirs(file_dir, exist_ok=True)
+    offset = size
+    ttfb = None
+    with open(part_path, mode) as f:
+        while chunk := response.read(CHUNK_SIZE):
+            if ttfb is None:
+                ttfb = perf_counter() - started
+            f.write(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+
+    __emit(
+        'download',
+        url=url,
+        status=response.status,
+        bytes=size - offset,
+        seconds=perf_counter() - started,
+        ttfb=ttfb,
+    )
+
+    if expected is not None and size < expected:
+        raise ContentTooShortError(
+            f'Download de {url} interrompido: {size} de {expected} bytes recebidos.',
+            (part_path, response.headers),
+        )
+    if expected is not None and size != expected:
+        # o trecho anexado não corresponde ao arquivo anunciado: a próxima tentativa recomeça do zero
+        remove(part_path)
+        raise ContentTooShortError(
+            f'Download de {url} inconsistente: {size} bytes recebidos, {expected} esperados. O download parcial foi descartado.',
+            (part_path, response.headers),
+        )
+
+    return {
+        'sha256': sha256.hexdigest(),
+        'size': size,
+        'etag': etag,
+        'last_modified': last_modified,
+    }
+
+def __is_cache_valid(url:str, file_dir:str, file_path:str, entry:dict, verify:bool, logger:Logger) -> bool:
+    if 'size' not in entry:
+        # arquivo baixado antes da existência do manifesto: é adotado como está
+        __update_manifest(
+            file_dir,
+            url,
+            sha256=__file_sha256(file_path),
+            size=getsize(file_path),
+            fetched_at=__now(),
+        )
+        return True
+
+    if getsize(file_path) != entry['size']:
+        logger.warning(f'O arquivo {file_path} não tem o tamanho registrado no manifesto ({entry["size"]} bytes). Descartando o cache.')
+        return False
+
+    if verify and __file_sha256(file_path) != entry.get('sha256'):
+        logger.warning(f'O hash sha256 do arquivo {file_path} não confere com o manifesto. Descartando o cache.')
+        return False
+
+    return True
+
+def __file_sha256(file_path:str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def __now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def __read_manifest(file_dir:str) -> dict:
+    """
+    Lê o manifesto do diretório de cache, que registra para cada URL o nome, o tamanho,
+    o hash sha256 e os cabeçalhos de validação do arquivo baixado.
 
     Parameters
     ----------
-    censo : Censo
-        O censo de referência.
-    nivel : Nivel
-        O nível geográfico da malha desejada.
-    filtro : str
-        Um filtro compatível com o método GeoDataFrame.query. Caso não seja fornecido, o GeoDataFrame é devolvido na íntegra.
-    logger : Logger
-        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
-    **kwargs : dict
-        Demais argumentos aceitos pela função Geopandas.read_file.
+    file_dir : str
+        O diretório de cache.
 
     Returns
     -------
-    GeoDataFrame
-        GeoDataFrame com os dados escolhidos.
+    dict
+        O conteúdo do manifesto, indexado pela URL, ou um dicionário vazio caso ele não exista ou esteja corrompido.
     """
-    url = get_malha_url(censo, nivel)
-    file_dir =join(cache_dir, nivel.value, str(censo.value))
-    logger.info(f'Carregando a malha de {nivel.value} do censo de {censo.value}.')
-    file_path = __prepare_cache(url, file_dir, logger=logger)
+    manifest_path = join(file_dir, MANIFEST_FILENAME)
+    if not exists(manifest_path):
+        return {}
 
-    gdf = read_file(file_path, **kwargs)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            return load(f)
+    except (OSError, JSONDecodeError):
+        return {}
 
-    if filtro:
-        gdf = gdf.query(filtro)
+def __write_manifest(file_dir:str, manifest:dict) -> None:
+    makedirs(file_dir, exist_ok=True)
+    manifest_path = join(file_dir, MANIFEST_FILENAME)
 
-    return gdf
+    # escreve em um arquivo temporário e substitui o original para nunca deixar o manifesto pela metade
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        dump(manifest, f, ensure_ascii=False, indent=2)
+    replace(tmp_path, manifest_path)
 
-def get_dados_url(censo:Censo, nivel:Nivel) -> str:
-    if censo == Censo.CENSO_2000:
-        if nivel == Nivel.SETORES:
-            return 'https://ftp.ibge.gov.br/Censos/Censo_Demografico_2000/Dados_do_Universo/Agregado_por_Setores_Censitarios/Agregado_de_setores_2000_SP_RM.zip'
-    if censo == Censo.CENSO_2010:
-        if nivel == Nivel.SETORES:
-            return 'https://ftp.ibge.gov.br/Censos/Censo_Demografico_2010/Resultados_do_Universo/Agregados_por_Setores_Censitarios/SP_Capital_20231030.zip'
+def __update_manifest(file_dir:str, url:str, **fields) -> None:
+    """
+    Atualiza os campos da entrada de uma URL no manifesto. Campos com valor None são removidos.
+    """
+    makedirs(file_dir, exist_ok=True)
+    with MANIFEST_LOCK, FileLock(join(file_dir, f'{MANIFEST_FILENAME}{LOCK_SUFFIX}')):
+        manifest = __read_manifest(file_dir)
+        entry = manifest.setdefault(url, {})
+        for key, value in fields.items():
+            if value is None:
+                entry.pop(key, None)
+            else:
+                entry[key] = value
+        __write_manifest(file_dir, manifest)
 
+def __record_derived_access(file_dir:str, url:str, parquet_path:str|None) -> None:
+    """
+    Registra no manifesto, junto à entrada do arquivo de origem, o último acesso a um artefato derivado.
+    """
+    if parquet_path is None or not exists(parquet_path):
+        return
 
-def download_dados(censo:Censo, nivel:Nivel, arquivo:str=None, filtro:str=None, logger:Logger=getLogger(), cache_dir:str='data/cache/', **kwargs) -> DataFrame:
-    url = get_dados_url(censo, nivel)
-    file_dir =join(cache_dir, nivel.value, str(censo.value))
-    logger.info(f'Carregando os dados de {nivel.value} do censo de {censo.value}.')
-    file_path = __prepare_cache(url, file_dir, logger=logger)
-
-    df = None
-    if censo == Censo.CENSO_2000 and arquivo != None:
-        with ZipFile(file_path, metadata_encoding='IBM850') as z:
-            with z.open(f'São Paulo1/{arquivo}') as f:
-                df = read_excel(f, thousands='.', decimal=',', dtype={'Cod_setor': str})
-    if censo == Censo.CENSO_2010 and arquivo != None:
-        with ZipFile(file_path) as z:
-            with z.open(f'Base informaçoes setores2010 universo SP_Capital/EXCEL/{arquivo}') as f:
-                df = read_excel(f, thousands='.', decimal=',', dtype={'Cod_setor': str})
+    with MANIFEST_LOCK, FileLock(join(file_dir, f'{MANIFEST_FILENAME}{LOCK_SUFFIX}')):
+        manifest = __read_manifest(file_dir)
+        if url not in manifest:
+            return
+        manifest[url].setdefault('derived', {})[basename(parquet_path)] = __now()
+        __write_manifest(file_dir, manifest)
 
-    if df is None:
-        return None
+def __evict(item:dict) -> bool:
+    """
+    Remove um arquivo do cache e a sua entrada no manifesto. Arquivos sendo baixados ou lidos
+    (com o lock do download ou o de uso ocupado) são mantidos e a função devolve False.
+    """
+    file_dir = dirname(item['path'])
+    try:
+        lock = FileLock(f'{item["path"]}{LOCK_SUFFIX}', timeout=0)
+        lock.acquire()
+    except TimeoutError:
+        return False
+    try:
+        use = FileLock(f'{item["path"]}{USE_SUFFIX}', timeout=0)
+        use.acquire()
+    except TimeoutError:
+        lock.release()
+        return False
 
-    if filtro:
-        df = df.query(filtro)
+    try:
+        with MANIFEST_LOCK, FileLock(join(file_dir, f'{MANIFEST_FILENAME}{LOCK_SUFFIX}')):
+            for path in (item['path'], f'{item["path"]}{PART_SUFFIX}'):
+                if exists(path):
+                    remove(path)
 
-    return df
+            manifest = __read_manifest(file_dir)
+            entry = manifest.get(item['url'], {})
+            if item['kind'] == 'derived':
+                entry.get('derived', {}).pop(basename(item['path']), None)
+            else:
+                # o nome do arquivo e os artefatos derivados continuam registrados: o nome evita
+                # uma nova consulta ao servidor e os derivados seguem válidos para o mesmo sha256
+                for key in ('sha256', 'size', 'etag', 'last_modified', 'fetched_at', 'last_access', 'partial'):
+                    entry.pop(key, None)
+            __write_manifest(file_dir, manifest)
+    finally:
+        use.release()
+        lock.release()
 
-def download_geosampa_shapefile(filename:str) -> str:
+    return True
+
+def __enforce_cache_budget(cache_dir:str, logger:Logger, keep:list[str]=()) -> None:
+    if CACHE_MAX_BYTES is None:
+        return
+    removed = gc_cache(cache_dir, CACHE_MAX_BYTES, logger=logger, keep=keep)
+    if removed:
+        __emit('cache', status='evicted', count=len(removed))
+
+def __derived_lock(parquet_path:str|None, logger:Logger) -> FileLock|nullcontext:
+    if parquet_path is None:
+        return nullcontext()
+    return FileLock(f'{parquet_path}{LOCK_SUFFIX}', logger=logger)
+
+def __derived_cache_path(url:str, file_dir:str, file_path:str, params:dict, suffix:str) -> str|None:
+    """
+    Devolve o caminho de um artefato derivado do arquivo baixado (por exemplo, uma cópia em Parquet).
+
+    O nome do artefato combina o nome do arquivo de origem com um hash do seu sha256 e dos
+    parâmetros utilizados na conversão, de modo que uma nova versão do arquivo ou uma leitura
+    com outros parâmetros gera um novo artefato. Devolve None quando os parâmetros não podem
+    ser serializados em JSON e, portanto, não identificam o artefato de forma confiável.
+    """
+    source = __read_manifest(file_dir).get(url, {}).get('sha256')
+    if not source:
+        return None
+
+    try:
+        key = dumps({'source': source, 'params': params}, sort_keys=True)
+    except TypeError:
+        return None
+
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    stem = basename(file_path).rsplit('.', 1)[0]
+    return join(file_dir, f'{stem}.{digest}{suffix}')
+
+@contextmanager
+def derived_file(
+    url:str,
+    file_dir:str,
+    file_path:str,
+    params:dict,
+    suffix:str,
+    logger:Logger=getLogger(),
+    cache_dir:str=None,
+    sources:list[str]=(),
+):
+    """
+    Reserva o caminho de um artefato derivado de um arquivo do cache (por exemplo, uma cópia em Parquet).
+
+    Dentro do with, o lock do artefato está adquirido: se o caminho devolvido ainda não existir, cabe
+    a quem chama gravá-lo, de preferência em <caminho>.part renomeado ao final. Ao sair, o acesso é
+    registrado no manifesto, junto à entrada de url, e o limite de tamanho do cache é aplicado.
+
+    Parameters
+    ----------
+    url : str
+        A URL do arquivo de origem, já baixado para file_dir.
+    file_dir : str
+        O diretório de cache do arquivo de origem.
+    file_path : str
+        O caminho local do arquivo de origem.
+    params : dict
+        Os parâmetros da conversão, que fazem parte da identificação do artefato.
+    suffix : str
+        A extensão do artefato (por exemplo, '.parquet').
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache, sobre o qual é aplicado o limite CACHE_MAX_BYTES.
+    sources : list[str]
+        URLs de outros arquivos de file_dir dos quais o artefato também depende.
+
+    Returns
+    -------
+    str ou None
+        O caminho do artefato, ou None quando ele não pode ser identificado de forma confiável.
+    """
+    # sem outras fontes, a identificação é a mesma das cópias Parquet das malhas e dos dados
+    manifest = __read_manifest(file_dir)
+    hashes = [manifest.get(source, {}).get('sha256') for source in sources]
+    path = None
+    if all(hashes):
+        path = __derived_cache_path(url, file_dir, file_path, {**params, 'sources': hashes} if hashes else params, suffix)
+
+    with __derived_lock(path, logger):
+        if path:
+            __emit('derived_cache', status='hit' if exists(path) else 'miss', path=path)
+        yield path
+        __record_derived_access(file_dir, url, path)
+    if path:
+        __enforce_cache_budget(cache_dir or file_dir, logger, keep=[file_path, path])
+
+def __get_url_filename(url:str, file_dir:str) -> str:
+    """
+    Descobre o nome do arquivo servido pela URL.
+
+    O nome é lido primeiro do manifesto do diretório de cache. Caso a URL ainda não
+    esteja registrada, apenas os cabeçalhos da resposta são consultados (HEAD, ou um
+    GET de um único byte quando o servidor não aceita HEAD) e o resultado é persistido
+    no manifesto, de modo que chamadas posteriores não acessam a rede.
+    """
+    manifest = __read_manifest(file_dir)
+    entry = manifest.get(url)
+    if entry and entry.get('filename'):
+        return entry['filename']
+
+    if OFFLINE:
+        __emit('cache', status='offline_miss', url=url)
+        raise OfflineError(f'Modo offline: {url} não está no cache local de {file_dir}.')
+
+    if __local_mirror_root() is not None:
+        filename = basename(__local_mirror_path(url))
+        __update_manifest(file_dir, url, filename=filename)
+        return filename
+
+    source = __mirror_url(url)
+    headers, final_url = __with_retry(source, lambda: __get_url_headers(source))
+    filename = __get_atachment_filename(headers)
+    if not filename:
+        filename = basename(urlparse(final_url).path)
+
+    __update_manifest(file_dir, url, filename=filename)
+
+    return filename
+
+def __get_url_headers(url:str) -> tuple[HTTPMessage, str]:
+    session = get_session()
+    try:
+        with session.request('HEAD', url) as response:
+            return response.headers, response.url
+    except HTTPError as e:
+        # alguns servidores não implementam HEAD; nesse caso pedimos apenas o primeiro byte
+        if e.code not in (403, 405, 501):
+            raise
+
+    with session.request('GET', url, headers={'Range': 'bytes=0-0'}) as response:
+        response.read()
+        return response.headers, response.url
+
+def __get_atachment_filename(headers:HTTPMessage) -> str:
+    if 'Content-Disposition' in headers:
+        cdisp = headers.get('Content-Disposition')
+        if 'filename' in cdisp:
+            return cdisp.split('filename=')[1].replace('"', '')
+
+def get_shapefile_url(filename:str) -> str:
+    build_url = UrlBuilder(GEOSAMPA_DOMAIN)
+    url = build_url(
+        namespace=NAMESPACE,
+        endpoint=ENDPOINT,
+        orig='DownloadCamadas',
+        arq=filename,
+        arqTipo='Shapefile'
+    )
+
+    return url
+
+def get_dataset(tipo:str, censo:Censo, nivel:Nivel) -> Dataset:
+    """
+    Essa função retorna a entrada do catálogo de determinado tipo de arquivo, nível geográfico e censo.
+
+    Parameters
+    ----------
+    tipo : str
+        O tipo do arquivo: 'malha' ou 'dados'.
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico desejado.
+
+    Returns
+    -------
+    Dataset
+        A entrada do catálogo.
+    """
+    try:
+        return CATALOGO[(tipo, censo, nivel)]
+    except KeyError:
+        raise ValueError(f'O catálogo não tem {tipo} de {nivel.value} para o censo de {censo.value}.') from None
+
+def get_malha_url(censo:Censo, nivel:Nivel) -> str:
+    """
+    Essa função retorna a url do arquivo georreferenciado de determinado nível geográfico do censo escolhido.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico da malha desejada.
+
+    Returns
+    -------
+    str
+        A URL do arquivo georreferenciado escolhido.
+    """
+    return get_dataset('malha', censo, nivel).url
+
+def __build_where(censo:Censo, nivel:Nivel, municipio:str|list[str]=None, where:str=None) -> str|None:
+    """
+    Monta a cláusula WHERE (no dialeto SQL do OGR) que combina o filtro de município e o filtro de atributos.
+    """
+    clauses = []
+    if municipio:
+        template = get_dataset('malha', censo, nivel).municipio
+        if not template:
+            raise ValueError(f'O filtro por município não está disponível para a malha de {nivel.value} do censo de {censo.value}.')
+        codigos = [municipio] if isinstance(municipio, str) else municipio
+        clauses.append('(' + ' OR '.join(template.format(codigo) for codigo in codigos) + ')')
+    if where:
+        clauses.append(f'({where})')
+
+    return ' AND '.join(clauses) or None
+
+def __municipio_field(censo:Censo, nivel:Nivel) -> str:
+    # o campo do código do município é o primeiro identificador do filtro da malha
+    return get_dataset('malha', censo, nivel).municipio.split()[0]
+
+def __read_vector(file_path:str, columns:list[str]=None, format:str=None, **kwargs) -> GeoDataFrame:
+    """
+    Lê um arquivo vetorial com Geopandas.read_file, carregando apenas as colunas pedidas.
+
+    A seleção de colunas é repassada ao motor de leitura (include_fields no fiona, columns
+    no pyogrio). Como o OGR não consegue filtrar por campos ignorados, as colunas citadas
+    na cláusula where também são lidas e descartadas depois do filtro. No fiona, a seleção
+    só é repassada quando format está em IGNORE_FIELDS_FORMATS; nos demais formatos (como o
+    GeoJSON), todas as colunas são lidas e a seleção é feita depois da leitura.
+    """
+    from geopandas import (
+        options as geopandas_options,
+        read_file,
+    )
+
+    if columns is None:
+        return read_file(file_path, **kwargs)
+
+    columns = list(columns)
+    read_columns = list(columns)
+    if kwargs.get('where'):
+        layer_kwargs = {k: v for k, v in kwargs.items() if k in ('engine', 'layer')}
+        fields = read_file(file_path, rows=0, **layer_kwargs).columns
+        # identificadores da cláusula, ignorando os literais entre aspas
+        tokens = set(findall(r'[A-Za-z_]\w*', sub(r"'[^']*'", '', kwargs['where'])))
+        read_columns += [field for field in fields if field in tokens and field not in read_columns]
+
+    engine = kwargs.get('engine') or geopandas_options.io_engine or 'fiona'
+    if engine == 'pyogrio':
+        gdf = read_file(file_path, columns=read_columns, **kwargs)
+    elif format in IGNORE_FIELDS_FORMATS:
+        gdf = read_file(file_path, include_fields=read_columns, **kwargs)
+    else:
+        gdf = read_file(file_path, **kwargs)
+
+    return gdf[columns + [gdf.geometry.name]]
+
+def __iter_geojson_features(f:BinaryIO, members:dict):
+    """
+    Percorre as feições de um FeatureCollection GeoJSON lendo o arquivo em blocos, sem
+    carregar o documento inteiro em memória.
+
+    Cada feição é decodificada isoladamente (JSONDecoder.raw_decode) assim que o bloco lido
+    a contém por inteiro. Os demais membros do documento (por exemplo, crs) são guardados em
+    members à medida que aparecem.
+    """
+    decoder = JSONDecoder()
+    reader = TextIOWrapper(f, encoding='utf-8-sig')
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> None:
+        nonlocal buffer, pos, eof
+        chunk = reader.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def peek(separators:str='') -> str:
+        # avança sobre espaços e separadores e devolve o próximo caractere significativo
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in separators):
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                raise JSONDecodeError('Fim inesperado do GeoJSON', buffer, pos)
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # um número no fim do bloco pode ter sido cortado: lê mais antes de aceitá-lo
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            pos = end
+            return value
+
+    if peek() != '{':
+        raise JSONDecodeError('O GeoJSON não começa com um objeto', buffer, pos)
+    pos += 1
+    while peek(',') != '}':
+        key = decode()
+        peek(':')
+        if key != 'features':
+            members[key] = decode()
+            continue
+        if peek() != '[':
+            raise JSONDecodeError('O membro features não é uma lista', buffer, pos)
+        pos += 1
+        while peek(',') != ']':
+            yield decode()
+        pos += 1
+
+def __intersects_bbox(geometry:dict|None, bbox:tuple) -> bool:
+    """Indica se a extensão de uma geometria GeoJSON intersecta bbox, sem construir a geometria."""
+    if not geometry:
+        return False
+    if geometry.get('type') == 'GeometryCollection':
+        return any(__intersects_bbox(part, bbox) for part in geometry.get('geometries', []))
+
+    xmin = ymin = float('inf')
+    xmax = ymax = float('-inf')
+    stack = [geometry.get('coordinates') or []]
+    while stack:
+        item = stack.pop()
+        if item and isinstance(item[0], (int, float)):
+            xmin, xmax = min(xmin, item[0]), max(xmax, item[0])
+            ymin, ymax = min(ymin, item[1]), max(ymax, item[1])
+        else:
+            stack.extend(item)
+    return xmin <= bbox[2] and xmax >= bbox[0] and ymin <= bbox[3] and ymax >= bbox[1]
+
+def __read_geojson_stream(
+    file_path:str,
+    field:str=None,
+    values:set[str]=None,
+    bbox:tuple=None,
+    columns:list[str]=None,
+    batch_size:int=10000,
+) -> GeoDataFrame:
+    """
+    Lê o GeoJSON contido em um zip mantendo apenas as feições cujo campo field está em values
+    e cuja extensão intersecta bbox.
+
+    As feições são filtradas à medida que são lidas e as geometrias são montadas em lotes de
+    batch_size feições, de modo que o pico de memória acompanha as feições mantidas, e não o
+    arquivo inteiro.
+    """
+    from geopandas import GeoDataFrame
+    from pandas import concat
+
+    members = {}
+    frames = []
+    batch = []
+    fields = []
+    with ZipFile(file_path) as z:
+        member = next(name for name in z.namelist() if name.lower().endswith(('.json', '.geojson')))
+        with z.open(member) as f:
+            for feature in __iter_geojson_features(f, members):
+                properties = feature.get('properties') or {}
+                fields = fields or list(properties)
+                if values is not None and str(properties.get(field)) not in values:
+                    continue
+                if bbox and not __intersects_bbox(feature.get('geometry'), bbox):
+                    continue
+                if columns is not None:
+                    feature['properties'] = {col: properties.get(col) for col in columns}
+                batch.append(feature)
+                if len(batch) >= batch_size:
+                    frames.append(GeoDataFrame.from_features(batch))
+                    batch = []
+    if batch:
+        frames.append(GeoDataFrame.from_features(batch))
+
+    # sem o membro crs (ausente ou null), o GeoJSON está, por definição, em WGS 84
+    crs = ((members.get('crs') or {}).get('properties') or {}).get('name') or 'EPSG:4326'
+    if not frames:
+        return GeoDataFrame(columns=[*(fields if columns is None else columns), 'geometry'], geometry='geometry', crs=crs)
+
+    gdf = concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].reset_index(drop=True)
+    # a geometria por último, na mesma ordem de colunas de Geopandas.read_file
+    gdf = gdf[[col for col in gdf.columns if col != 'geometry'] + ['geometry']]
+    return gdf.set_crs(crs)
+
+def __flight_key(*parts) -> str|None:
+    try:
+        return dumps(parts, sort_keys=True)
+    except TypeError:
+        return None
+
+def __single_flight(key:str|None, operation:Callable):
+    """
+    Executa a operação uma única vez para chamadas simultâneas com a mesma chave.
+
+    A primeira chamada executa a operação; as que chegam enquanto ela está em andamento
+    aguardam o mesmo Future e recebem o mesmo resultado (ou a mesma exceção). Terminada a
+    operação, a chave é liberada: o resultado não fica guardado para chamadas posteriores.
+    Uma chave None desativa o compartilhamento.
+    """
+    if key is None:
+        return operation()
+
+    with FLIGHTS_LOCK:
+        future = FLIGHTS.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            FLIGHTS[key] = future
+
+    if not leader:
+        __emit('coalesced', key=key)
+        return future.result()
+
+    try:
+        result = operation()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with FLIGHTS_LOCK:
+            FLIGHTS.pop(key, None)
+
+def download_malha(
+    censo:Censo,
+    nivel:Nivel,
+    filtro:str=None,
+    logger:Logger=getLogger(),
+    cache_dir:str='data/cache/',
+    revalidate:bool=False,
+    verify:bool=False,
+    cache_parquet:bool=True,
+    municipio:str|list[str]=None,
+    bbox:tuple=None,
+    where:str=None,
+    crs:int|str=None,
+    columns:list[str]=None,
+    **kwargs,
+) -> GeoDataFrame:
+    """
+    Baixa a malha no nível especificado para o censo escolhido. Os parâmetros enviados via kwargs são enviados ao método read_file do Geopandas.
+
+    O parâmetro filtro pode ser passado como uma string que será utilizado como filtro para o método GeoDataFrame.query.
+
+    O parâmetro logger pode ser passado como uma instância de Logger para a utilização de um Logger diferente do padrão.
+
+    Os parâmetros municipio, bbox e where são aplicados durante a leitura do arquivo, de modo que apenas as feições
+    selecionadas são carregadas em memória. Diferentemente de filtro, que é aplicado depois da leitura completa da malha.
+    Na malha de 2022, publicada como um único GeoJSON para todo o estado, o arquivo é lido em fluxo e as feições fora
+    de municipio e bbox são descartadas durante a leitura, desde que where e os demais kwargs não sejam utilizados.
+
+    Algumas malhas são publicadas com um sistema de coordenadas incorreto ou ausente; nesses casos o sistema registrado
+    na entrada do catálogo (Dataset.crs em CATALOGO) substitui o do arquivo. Quando crs é fornecido, as geometrias são reprojetadas para ele.
+
+    Na primeira leitura, a malha é gravada em GeoParquet ao lado do arquivo baixado, identificada pelo hash do arquivo
+    de origem, pelos filtros, pelo crs e pelos kwargs de leitura. As leituras seguintes com os mesmos parâmetros utilizam
+    essa cópia, já reprojetada.
+
+    Chamadas simultâneas (em threads do mesmo processo) com os mesmos parâmetros compartilham um único download e
+    leitura. Cada chamada recebe uma cópia rasa do GeoDataFrame: adicionar, remover ou substituir colunas não afeta as
+    demais, mas os dados são compartilhados, de modo que alterações in-place nos valores só ficam isoladas com o modo
+    copy-on-write do pandas (pandas.options.mode.copy_on_write = True).
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico da malha desejada.
+    filtro : str
+        Um filtro compatível com o método GeoDataFrame.query. Caso não seja fornecido, o GeoDataFrame é devolvido na íntegra.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se o arquivo em cache ainda é atual antes de utilizá-lo.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho, e o baixa novamente caso não confira.
+    cache_parquet : bool
+        Se False, a malha é sempre lida do arquivo original, sem utilizar ou gerar a cópia GeoParquet.
+    municipio : str ou list[str]
+        O código IBGE de 7 dígitos do município (ou uma lista de códigos) cujas feições devem ser carregadas.
+    bbox : tuple
+        Um retângulo (xmin, ymin, xmax, ymax), no sistema de coordenadas do arquivo original, que as feições devem intersectar.
+    where : str
+        Uma cláusula WHERE no dialeto SQL do OGR aplicada aos atributos das feições.
+    crs : int ou str
+        O sistema de coordenadas de destino, como código EPSG (por exemplo, 31983) ou string aceita pelo pyproj.
+    columns : list[str]
+        As colunas de atributos a serem lidas, além da geometria. Caso não seja fornecido, todas as colunas são lidas.
+    **kwargs : dict
+        Demais argumentos aceitos pela função Geopandas.read_file.
+
+    Returns
+    -------
+    GeoDataFrame
+        GeoDataFrame com os dados escolhidos.
+    """
+    # chamadas simultâneas com os mesmos parâmetros compartilham um único download e leitura
+    key = __flight_key('malha', censo.value, nivel.value, abspath(cache_dir), revalidate, verify, cache_parquet, municipio, bbox, where, crs, columns, kwargs)
+    gdf = __single_flight(
+        key,
+        lambda: __load_malha(censo, nivel, logger, cache_dir, revalidate, verify, cache_parquet, municipio, bbox, where, crs, columns, dict(kwargs)),
+    )
+
+    if filtro:
+        return gdf.query(filtro)
+
+    return gdf.copy(deep=False)
+
+def __load_malha(
+    censo:Censo,
+    nivel:Nivel,
+    logger:Logger,
+    cache_dir:str,
+    revalidate:bool,
+    verify:bool,
+    cache_parquet:bool,
+    municipio:str|list[str],
+    bbox:tuple,
+    where:str,
+    crs:int|str,
+    columns:list[str],
+    kwargs:dict,
+) -> GeoDataFrame:
+    entry = get_dataset('malha', censo, nivel)
+    url = entry.url
+    file_dir =join(cache_dir, nivel.value, str(censo.value))
+    logger.info(f'Carregando a malha de {nivel.value} do censo de {censo.value}.')
+    # o arquivo não é removido pelo limite do cache enquanto é lido
+    with ExitStack() as hold:
+        file_path = __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir, hold=hold)
+
+        # as malhas em GeoJSON são lidas em fluxo, filtrando município e bbox durante a leitura;
+        # where e os demais kwargs de read_file exigem a leitura pelo OGR
+        stream = entry.format == 'geojson' and where is None and not kwargs
+
+        where = __build_where(censo, nivel, municipio, where)
+        if where:
+            kwargs['where'] = where
+        if bbox:
+            kwargs['bbox'] = tuple(bbox)
+
+        crs_origem = entry.crs
+
+        parquet_path = None
+        if cache_parquet:
+            params = {**kwargs, 'crs_origem': crs_origem, 'crs': crs, 'columns': columns}
+            parquet_path = __derived_cache_path(url, file_dir, file_path, params, suffix='.parquet')
+
+        with __derived_lock(parquet_path, logger):
+            dataset = f'malha/{nivel.value}/{censo.value}'
+            started = perf_counter()
+            if parquet_path:
+                __emit('derived_cache', status='hit' if exists(parquet_path) else 'miss', path=parquet_path)
+            if parquet_path and exists(parquet_path):
+                from geopandas import read_parquet
+                logger.info(f'Usando a cópia GeoParquet {parquet_path}.')
+                gdf = read_parquet(parquet_path)
+                __emit('parse', dataset=dataset, source='parquet', seconds=perf_counter() - started)
+            else:
+                if stream:
+                    gdf = __read_geojson_stream(
+                        file_path,
+                        field=__municipio_field(censo, nivel),
+                        values={municipio} if isinstance(municipio, str) else (set(municipio) if municipio else None),
+                        bbox=kwargs.get('bbox'),
+                        columns=columns,
+                    )
+                else:
+                    gdf = __read_vector(file_path, columns, entry.format, **kwargs)
+                if crs_origem:
+                    gdf = gdf.set_crs(crs_origem, allow_override=True)
+                if crs:
+                    gdf = gdf.to_crs(crs)
+                __emit('parse', dataset=dataset, source='original', seconds=perf_counter() - started)
+                if parquet_path:
+                    logger.info(f'Gravando a cópia GeoParquet {parquet_path}.')
+                    tmp_path = f'{parquet_path}{PART_SUFFIX}'
+                    gdf.to_parquet(tmp_path)
+                    replace(tmp_path, parquet_path)
+            __record_derived_access(file_dir, url, parquet_path)
+    if parquet_path:
+        __enforce_cache_budget(cache_dir, logger, keep=[file_path, parquet_path])
+
+    return gdf
+
+def get_dados_url(censo:Censo, nivel:Nivel) -> str:
+    """
+    Essa função retorna a url do arquivo de dados agregados de determinado nível geográfico do censo escolhido.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico dos dados desejados.
+
+    Returns
+    -------
+    str
+        A URL do arquivo de dados agregados escolhido.
+    """
+    return get_dataset('dados', censo, nivel).url
+
+def __dados_zip(entry:Dataset, file_path:str) -> ZipFile:
+    return ZipFile(file_path, metadata_encoding=entry.encoding)
+
+def __compact_numeric(values:Series) -> Series:
+    """
+    Converte uma coluna numérica para Int32 quando os valores são inteiros e cabem em 32 bits,
+    Int64 quando são inteiros maiores e Float64 nos demais casos, mantendo os ausentes como NA.
+    """
+    from numpy import (
+        iinfo,
+        int32,
+    )
+
+    values = values.convert_dtypes(convert_string=False, convert_boolean=False)
+    if values.dtype == 'Int64' and values.between(iinfo(int32).min, iinfo(int32).max).all():
+        values = values.astype('Int32')
+    return values
+
+def __parse_excel(f:BinaryIO|bytes, columns:list[str]=None, schema:dict[str, Variavel]=None, rename:bool=False, key:str='Cod_setor', suprimido:str=None) -> DataFrame:
+    """
+    Lê uma planilha de dados agregados do censo, com a coluna key (o código do setor) como texto.
+
+    Quando schema é fornecido (mesmo que vazio), o marcador suprimido é tratado como ausente em
+    todas as colunas; as variáveis presentes em schema são convertidas diretamente para o tipo
+    registrado durante a leitura e as demais variáveis (VARIAVEL_PATTERN) para o menor tipo numérico
+    anulável que as representa. Se rename=True, as variáveis de schema recebem também o nome semântico registrado.
+    """
+    from pandas import (
+        read_excel,
+        to_numeric,
+    )
+
+    if isinstance(f, bytes):
+        f = BytesIO(f)
+
+    typed = schema is not None
+    schema = schema or {}
+    if columns is not None:
+        schema = {col: var for col, var in schema.items() if col in columns}
+
+    dtype = {key: str}
+    dtype.update({col: var.dtype for col, var in schema.items()})
+    na_values = [suprimido] if typed and suprimido else None
+
+    df = read_excel(f, thousands='.', decimal=',', dtype=dtype, na_values=na_values, usecols=columns)
+
+    if typed:
+        for col in df.columns:
+            if col not in schema and col != key and fullmatch(VARIAVEL_PATTERN, str(col)):
+                df[col] = __compact_numeric(to_numeric(df[col]))
+
+    if rename:
+        df = df.rename(columns={col: var.nome for col, var in schema.items()})
+
+    return df
+
+def __timed_parse_excel(*args) -> tuple[DataFrame, float]:
+    started = perf_counter()
+    df = __parse_excel(*args)
+    return df, perf_counter() - started
+
+def __dados_schema(entry:Dataset, arquivo:str, typed:bool) -> dict[str, Variavel]|None:
+    return (entry.schema or {}).get(arquivo.upper(), {}) if typed else None
+
+def __read_dados_excel(entry:Dataset, file_path:str, arquivo:str, columns:list[str]=None, typed:bool=True, rename:bool=False) -> DataFrame:
+    with __dados_zip(entry, file_path) as z:
+        with z.open(entry.member.format(arquivo=arquivo)) as f:
+            return __parse_excel(f, columns, __dados_schema(entry, arquivo, typed), rename, entry.key, entry.suprimido)
+
+def __write_parquet_cache(df:DataFrame, parquet_path:str, logger:Logger) -> None:
+    from pandas.api.types import infer_dtype
+
+    # colunas que misturam números e texto (como as variáveis com valores suprimidos lidas com
+    # typed=False) não têm tipo em Parquet; convertê-las mudaria o DataFrame das próximas leituras
+    mixed = [col for col in df.columns if df[col].dtype == object and infer_dtype(df[col], skipna=True).startswith('mixed')]
+    if mixed:
+        logger.info(f'A cópia Parquet {parquet_path} não é gravada: as colunas {mixed} misturam números e texto.')
+        return
+
+    logger.info(f'Gravando a cópia Parquet {parquet_path}.')
+    tmp_path = f'{parquet_path}{PART_SUFFIX}'
+    try:
+        df.to_parquet(tmp_path, index=False)
+        replace(tmp_path, parquet_path)
+    except (TypeError, ValueError) as e:
+        # colunas com objetos que o Parquet não representa; a leitura segue a partir do original
+        logger.warning(f'Não foi possível gravar a cópia Parquet {parquet_path}: {e}')
+        if exists(tmp_path):
+            remove(tmp_path)
+
+def download_dados(censo:Censo, nivel:Nivel, arquivo:str=None, filtro:str=None, logger:Logger=getLogger(), cache_dir:str='data/cache/', revalidate:bool=False, verify:bool=False, columns:list[str]=None, cache_parquet:bool=True, typed:bool=True, rename:bool=False, **kwargs) -> DataFrame:
+    """
+    Baixa os dados agregados no nível especificado para o censo escolhido e lê a planilha indicada em arquivo.
+
+    Na primeira leitura, a planilha é gravada em Parquet ao lado do arquivo baixado, identificada pelo hash do
+    arquivo de origem, pelo nome da planilha e pelas colunas. As leituras seguintes utilizam essa cópia, com os
+    mesmos tipos da leitura original (Cod_setor como texto e números já convertidos).
+
+    As variáveis registradas no catálogo (CATALOGO) são lidas já com o seu tipo compacto (Int32 ou Float64 anuláveis)
+    e as demais com Int64 ou Float64 anuláveis; em todas elas, os valores suprimidos pelo IBGE (como 'X') são
+    convertidos em ausentes.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico dos dados desejados.
+    arquivo : str
+        O nome da planilha dentro do arquivo compactado (por exemplo, 'Domicilio01_SP1.XLS').
+    filtro : str
+        Um filtro compatível com o método DataFrame.query. Caso não seja fornecido, o DataFrame é devolvido na íntegra.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se o arquivo em cache ainda é atual antes de utilizá-lo.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho, e o baixa novamente caso não confira.
+    columns : list[str]
+        As colunas a serem lidas da planilha (por exemplo, ['Cod_setor', 'V002']). Caso não seja fornecido, todas as colunas são lidas.
+    cache_parquet : bool
+        Se False, a planilha é sempre lida do arquivo original, sem utilizar ou gerar a cópia Parquet.
+    typed : bool
+        Se False, as variáveis são lidas sem conversão de tipo, como na planilha original.
+    rename : bool
+        Se True, as variáveis registradas no catálogo (CATALOGO) recebem o nome semântico (por exemplo, 'V0237' vira 'pop_total').
+
+    Returns
+    -------
+    DataFrame
+        DataFrame com os dados escolhidos, ou None caso arquivo não seja fornecido.
+    """
+    entry = get_dataset('dados', censo, nivel)
+    url = entry.url
+    file_dir =join(cache_dir, nivel.value, str(censo.value))
+    logger.info(f'Carregando os dados de {nivel.value} do censo de {censo.value}.')
+    # o arquivo não é removido pelo limite do cache enquanto é lido
+    with ExitStack() as hold:
+        file_path = __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir, hold=hold)
+
+        if arquivo is None:
+            return None
+
+        parquet_path = None
+        if cache_parquet:
+            params = {'arquivo': arquivo, 'columns': columns, 'typed': typed, 'rename': rename}
+            parquet_path = __derived_cache_path(url, file_dir, file_path, params, suffix='.parquet')
+
+        with __derived_lock(parquet_path, logger):
+            dataset = f'dados/{nivel.value}/{censo.value}/{arquivo}'
+            started = perf_counter()
+            if parquet_path:
+                __emit('derived_cache', status='hit' if exists(parquet_path) else 'miss', path=parquet_path)
+            if parquet_path and exists(parquet_path):
+                from pandas import read_parquet
+                logger.info(f'Usando a cópia Parquet {parquet_path}.')
+                df = read_parquet(parquet_path)
+                __emit('parse', dataset=dataset, source='parquet', seconds=perf_counter() - started)
+            else:
+                df = __read_dados_excel(entry, file_path, arquivo, columns, typed, rename)
+                __emit('parse', dataset=dataset, source='original', seconds=perf_counter() - started)
+                if parquet_path and df is not None:
+                    __write_parquet_cache(df, parquet_path, logger)
+            __record_derived_access(file_dir, url, parquet_path)
+    if parquet_path:
+        __enforce_cache_budget(cache_dir, logger, keep=[file_path, parquet_path])
+
+    if df is None:
+        return None
+
+    if filtro:
+        df = df.query(filtro)
+
+    return df
+
+def download_dados_many(
+    censo:Censo,
+    nivel:Nivel,
+    arquivos:list[str],
+    merge:bool=False,
+    max_workers:int=None,
+    logger:Logger=getLogger(),
+    cache_dir:str='data/cache/',
+    revalidate:bool=False,
+    verify:bool=False,
+    columns:list[str]|dict[str, list[str]]=None,
+    cache_parquet:bool=True,
+    typed:bool=True,
+    rename:bool=False,
+) -> dict[str, DataFrame]|DataFrame:
+    """
+    Lê várias planilhas do mesmo arquivo de dados agregados de uma só vez.
+
+    O arquivo compactado é aberto uma única vez e as planilhas que ainda não estão no cache
+    Parquet são interpretadas em paralelo, em processos separados.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico dos dados desejados.
+    arquivos : list[str]
+        Os nomes das planilhas dentro do arquivo compactado.
+    merge : bool
+        Se True, devolve um único DataFrame com as planilhas unidas por Cod_setor. Colunas repetidas
+        recebem como sufixo o nome da planilha de onde vieram.
+    max_workers : int
+        O número máximo de processos. Caso não seja fornecido, é utilizado o padrão do ProcessPoolExecutor.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se o arquivo em cache ainda é atual antes de utilizá-lo.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho, e o baixa novamente caso não confira.
+    columns : list[str] ou dict[str, list[str]]
+        As colunas a serem lidas, para todas as planilhas ou indexadas pelo nome da planilha.
+    cache_parquet : bool
+        Se False, as planilhas são sempre lidas do arquivo original, sem utilizar ou gerar as cópias Parquet.
+    typed : bool
+        Se False, as variáveis são lidas sem conversão de tipo, como na planilha original.
+    rename : bool
+        Se True, as variáveis registradas no catálogo (CATALOGO) recebem o nome semântico.
+
+    Returns
+    -------
+    dict[str, DataFrame] ou DataFrame
+        Os DataFrames indexados pelo nome da planilha ou, se merge=True, um único DataFrame.
+    """
+    entry = get_dataset('dados', censo, nivel)
+    url = entry.url
+    file_dir =join(cache_dir, nivel.value, str(censo.value))
+    logger.info(f'Carregando {len(arquivos)} planilhas de {nivel.value} do censo de {censo.value}.')
+    # o arquivo não é removido pelo limite do cache enquanto é lido
+    with ExitStack() as hold:
+        file_path = __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir, hold=hold)
+
+        if not isinstance(columns, dict):
+            columns = {arquivo: columns for arquivo in arquivos}
+
+        dfs = {}
+        parquet_paths = {}
+        derived_paths = []
+        for arquivo in arquivos:
+            parquet_path = None
+            if cache_parquet:
+                params = {'arquivo': arquivo, 'columns': columns.get(arquivo), 'typed': typed, 'rename': rename}
+                parquet_path = __derived_cache_path(url, file_dir, file_path, params, suffix='.parquet')
+            if parquet_path:
+                derived_paths.append(parquet_path)
+                __emit('derived_cache', status='hit' if exists(parquet_path) else 'miss', path=parquet_path)
+            if parquet_path and exists(parquet_path):
+                from pandas import read_parquet
+                logger.info(f'Usando a cópia Parquet {parquet_path}.')
+                started = perf_counter()
+                dfs[arquivo] = read_parquet(parquet_path)
+                __emit('parse', dataset=f'dados/{nivel.value}/{censo.value}/{arquivo}', source='parquet', seconds=perf_counter() - started)
+            else:
+                parquet_paths[arquivo] = parquet_path
+
+        with ExitStack() as locks:
+            # as cópias que faltam ficam bloqueadas até serem gravadas; as que outro processo
+            # terminou de gravar enquanto esperávamos o lock são lidas do Parquet
+            for parquet_path in sorted(path for path in parquet_paths.values() if path):
+                locks.enter_context(FileLock(f'{parquet_path}{LOCK_SUFFIX}', logger=logger))
+            for arquivo, parquet_path in list(parquet_paths.items()):
+                if parquet_path and exists(parquet_path):
+                    from pandas import read_parquet
+                    dfs[arquivo] = read_parquet(parquet_path)
+                    del parquet_paths[arquivo]
+
+            if parquet_paths:
+                from concurrent.futures import ProcessPoolExecutor
+
+                with __dados_zip(entry, file_path) as z:
+                    contents = {arquivo: z.read(entry.member.format(arquivo=arquivo)) for arquivo in parquet_paths}
+
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    futures = {
+                        arquivo: executor.submit(
+                            __timed_parse_excel,
+                            content,
+                            columns.get(arquivo),
+                            __dados_schema(entry, arquivo, typed),
+                            rename,
+                            entry.key,
+                            entry.suprimido,
+                        )
+                        for arquivo, content in contents.items()
+                    }
+                    for arquivo, future in futures.items():
+                        dfs[arquivo], seconds = future.result()
+                        __emit('parse', dataset=f'dados/{nivel.value}/{censo.value}/{arquivo}', source='original', seconds=seconds)
+                        if parquet_paths[arquivo]:
+                            __write_parquet_cache(dfs[arquivo], parquet_paths[arquivo], logger)
+
+    for parquet_path in derived_paths:
+        __record_derived_access(file_dir, url, parquet_path)
+    if derived_paths:
+        __enforce_cache_budget(cache_dir, logger, keep=[file_path, *derived_paths])
+
+    dfs = {arquivo: dfs[arquivo] for arquivo in arquivos}
+    if not merge:
+        return dfs
+
+    # uma coluna presente em mais de uma planilha recebe o sufixo em todas elas, inclusive na primeira
+    counts = Counter(col for df in dfs.values() for col in df.columns if col != entry.key)
+    merged = None
+    for arquivo, df in dfs.items():
+        sufixo = '_' + arquivo.rsplit('.', 1)[0]
+        df = df.rename(columns={col: f'{col}{sufixo}' for col in df.columns if counts[col] > 1})
+        merged = df if merged is None else merged.merge(df, on=entry.key, how='outer')
+
+    return merged
+
+def download_file(url:str, file_dir:str, filename:str=None, logger:Logger=getLogger(), revalidate:bool=False, verify:bool=False, cache_dir:str=None) -> str:
+    """
+    Baixa uma URL qualquer para o cache local, com o mesmo manifesto, locks, espelho e modo offline
+    utilizados pelas malhas e pelos dados.
+
+    Parameters
+    ----------
+    url : str
+        A URL do arquivo.
+    file_dir : str
+        O diretório de cache.
+    filename : str
+        O nome do arquivo no cache. Caso não seja fornecido, é utilizado o nome informado pelo
+        servidor; deve ser fornecido para URLs que diferem apenas nos parâmetros e que o
+        servidor entrega com o mesmo nome.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    revalidate : bool
+        Se True, confere com o servidor se o arquivo em cache ainda é atual antes de utilizá-lo.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho, e o baixa novamente caso não confira.
+    cache_dir : str
+        O diretório raiz do cache, sobre o qual é aplicado o limite CACHE_MAX_BYTES.
+
+    Returns
+    -------
+    str
+        O caminho do arquivo no cache local.
+    """
+    if filename and __read_manifest(file_dir).get(url, {}).get('filename') != filename:
+        __update_manifest(file_dir, url, filename=filename)
+    return __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir)
+
+def download_geosampa_shapefile(filename:str, revalidate:bool=False, cache_dir:str='data/cache/', verify:bool=False) -> str:
+    """
+    Baixa o zip de uma camada do GeoSampa e devolve o seu caminho local. Para ler as camadas
+    do zip, veja shapefile_members e read_geosampa_shapefile. Se verify=True, o hash sha256 do zip
+    em cache é conferido com o manifesto, e o zip é baixado novamente caso não confira.
+    """
+    url = get_shapefile_url(filename)
+    file_path = __prepare_cache(url, join(cache_dir, 'geosampa_shp'), revalidate=revalidate, verify=verify, cache_dir=cache_dir)
+    return file_path
+
+def shapefile_members(file_path:str) -> list[str]:
+    """
+    Lista, na ordem do arquivo, os caminhos dos shapefiles (membros .shp) de um zip.
+
+    Parameters
+    ----------
+    file_path : str
+        O caminho local do zip.
+
+    Returns
+    -------
+    list[str]
+        Os caminhos dos membros .shp dentro do zip.
+    """
+    with ZipFile(file_path) as z:
+        return [name for name in z.namelist() if name.lower().endswith('.shp')]
+
+def __resolve_members(members:list[str], layers:list[str]|None) -> list[str]:
+    """
+    Encontra no índice do zip o membro de cada camada pedida, pelo caminho completo, pelo nome
+    do arquivo ou pelo nome sem a extensão .shp, sem distinguir maiúsculas e minúsculas.
+    """
+    if layers is None:
+        return members
+
+    index = {}
+    for member in members:
+        name = basename(member)
+        for alias in (member, name, name[:-4]):
+            index.setdefault(alias.lower(), member)
+
+    missing = [layer for layer in layers if layer.lower() not in index]
+    if missing:
+        raise ValueError(f'Camadas não encontradas no zip: {missing}. Camadas disponíveis: {members}.')
+
+    return [index[layer.lower()] for layer in layers]
+
+def read_geosampa_shapefile(
+    filename:str,
+    layers:list[str]=None,
+    columns:list[str]=None,
+    crs:int|str='EPSG:31983',
+    layer_column:str=None,
+    max_workers:int=None,
+    logger:Logger=getLogger(),
+    cache_dir:str='data/cache/',
+    revalidate:bool=False,
+    verify:bool=False,
+    cache_parquet:bool=True,
+) -> GeoDataFrame:
+    """
+    Baixa o zip de uma camada do GeoSampa e lê os seus shapefiles em um único GeoDataFrame.
+
+    Os membros do zip são indexados uma vez; os shapefiles escolhidos são lidos em paralelo e
+    concatenados uma única vez, na ordem de layers. Na primeira leitura, o resultado é gravado
+    em GeoParquet ao lado do zip, e as leituras seguintes com os mesmos parâmetros utilizam
+    essa cópia.
+
+    Parameters
+    ----------
+    filename : str
+        O nome da camada no GeoSampa, como em download_geosampa_shapefile.
+    layers : list[str]
+        Os shapefiles a serem lidos, pelo caminho no zip, pelo nome do arquivo ou pelo nome sem
+        a extensão (por exemplo, 'SIRGAS_SHP_riscogeologicoatual_AD'). Caso não seja fornecido,
+        todos os shapefiles do zip são lidos.
+    columns : list[str]
+        As colunas a serem lidas de cada shapefile. Caso não seja fornecido, todas as colunas são lidas.
+    crs : int ou str
+        O sistema de coordenadas das camadas sem .prj, como as do GeoSampa. Camadas que declaram
+        outro sistema são reprojetadas para ele.
+    layer_column : str
+        Se fornecido, o nome de uma coluna que recebe o nome (sem a extensão) do shapefile de cada feição.
+    max_workers : int
+        O número máximo de shapefiles lidos simultaneamente.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se o arquivo em cache ainda é atual antes de utilizá-lo.
+    verify : bool
+        Se True, confere o hash sha256 do arquivo em cache, além do tamanho, e o baixa novamente caso não confira.
+    cache_parquet : bool
+        Se False, os shapefiles são sempre lidos do zip, sem utilizar ou gerar a cópia GeoParquet.
+
+    Returns
+    -------
+    GeoDataFrame
+        As feições de todos os shapefiles escolhidos.
+    """
     url = get_shapefile_url(filename)
-    file_path = __prepare_cache(url, 'data/cache/geosampa_shp')
-    return file_path
\ No newline at end of file
+    file_dir = join(cache_dir, 'geosampa_shp')
+    # o arquivo não é removido pelo limite do cache enquanto é lido
+    with ExitStack() as hold:
+        file_path = __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir, hold=hold)
+        members = __resolve_members(shapefile_members(file_path), layers)
+
+        def read(member:str) -> GeoDataFrame:
+            gdf = __read_vector(f'zip://{abspath(file_path)}!{member}', columns, 'shapefile')
+            gdf = gdf.set_crs(crs) if gdf.crs is None else gdf.to_crs(crs)
+            if layer_column:
+                gdf[layer_column] = basename(member)[:-4]
+            return gdf
+
+        params = {'layers': members, 'columns': columns, 'crs': crs, 'layer_column': layer_column}
+        derived = derived_file(url, file_dir, file_path, params, suffix='.parquet', logger=logger, cache_dir=cache_dir) if cache_parquet else nullcontext()
+        with derived as parquet_path:
+            dataset = f'geosampa/{basename(file_path)}'
+            started = perf_counter()
+            if parquet_path and exists(parquet_path):
+                from geopandas import read_parquet
+                logger.info(f'Usando a cópia GeoParquet {parquet_path}.')
+                gdf = read_parquet(parquet_path)
+                __emit('parse', dataset=dataset, source='parquet', seconds=perf_counter() - started)
+            else:
+                from geopandas import GeoDataFrame
+                from pandas import concat
+
+                logger.info(f'Lendo {len(members)} shapefiles de {file_path}.')
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    gdfs = list(executor.map(read, members))
+                gdf = GeoDataFrame(concat(gdfs, ignore_index=True), crs=gdfs[0].crs) if gdfs else GeoDataFrame(geometry=[], crs=crs)
+                __emit('parse', dataset=dataset, source='original', seconds=perf_counter() - started)
+                if parquet_path:
+                    logger.info(f'Gravando a cópia GeoParquet {parquet_path}.')
+                    tmp_path = f'{parquet_path}{PART_SUFFIX}'
+                    gdf.to_parquet(tmp_path)
+                    replace(tmp_path, parquet_path)
+
+    return gdf
+
+# o campo tipo distingue MalhaSpec e DadosSpec do mesmo censo e nível, que de outro modo seriam
+# tuplas iguais e colidiriam em prefetch
+class MalhaSpec(NamedTuple):
+    """Malha de um nível geográfico de um censo, para uso em prefetch."""
+    censo: Censo
+    nivel: Nivel
+    tipo: str = 'malha'
+
+class DadosSpec(NamedTuple):
+    """Arquivo de dados agregados de um nível geográfico de um censo, para uso em prefetch."""
+    censo: Censo
+    nivel: Nivel
+    tipo: str = 'dados'
+
+class GeoSampaSpec(NamedTuple):
+    """Camada do GeoSampa baixada como shapefile, para uso em prefetch."""
+    filename: str
+
+class TabelaSpec(NamedTuple):
+    """Planilha de um arquivo de dados agregados, para uso em plan_batch e load_batch."""
+    censo: Censo
+    nivel: Nivel
+    arquivo: str
+    tipo: str = 'tabela'
+
+class Plano(NamedTuple):
+    """Arquivo compactado de um lote e os itens lidos a partir dele."""
+    url: str
+    file_dir: str
+    specs: list
+
+def __resolve_spec(spec:MalhaSpec|DadosSpec|TabelaSpec|GeoSampaSpec|tuple|str, cache_dir:str) -> tuple[str, str]:
+    if isinstance(spec, str):
+        spec = GeoSampaSpec(spec)
+    elif isinstance(spec, tuple) and not isinstance(spec, (MalhaSpec, DadosSpec, TabelaSpec, GeoSampaSpec)):
+        spec = MalhaSpec(*spec)
+
+    if isinstance(spec, MalhaSpec):
+        return get_malha_url(spec.censo, spec.nivel), join(cache_dir, spec.nivel.value, str(spec.censo.value))
+    if isinstance(spec, (DadosSpec, TabelaSpec)):
+        return get_dados_url(spec.censo, spec.nivel), join(cache_dir, spec.nivel.value, str(spec.censo.value))
+    if isinstance(spec, GeoSampaSpec):
+        return get_shapefile_url(spec.filename), join(cache_dir, 'geosampa_shp')
+
+    raise TypeError(f'Especificação de download não reconhecida: {spec!r}')
+
+def prefetch(
+    specs:list[MalhaSpec|DadosSpec|GeoSampaSpec|tuple|str],
+    max_workers:int=8,
+    max_per_host:int=2,
+    logger:Logger=getLogger(),
+    cache_dir:str='data/cache/',
+    revalidate:bool=False,
+    verify:bool=False,
+) -> dict:
+    """
+    Baixa para o cache local, em paralelo, os arquivos de várias malhas, dados e camadas do GeoSampa.
+
+    Os arquivos são apenas baixados; a leitura continua sendo feita por download_malha,
+    download_dados e download_geosampa_shapefile, que passam a encontrá-los no cache.
+
+    Parameters
+    ----------
+    specs : list
+        Os arquivos desejados. Cada item pode ser um MalhaSpec, DadosSpec ou GeoSampaSpec,
+        uma tupla (Censo, Nivel), interpretada como malha, ou uma string, interpretada como
+        o nome de uma camada do GeoSampa.
+    max_workers : int
+        O número máximo de downloads simultâneos.
+    max_per_host : int
+        O número máximo de downloads simultâneos para um mesmo servidor.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se os arquivos em cache ainda são atuais.
+    verify : bool
+        Se True, confere o hash sha256 dos arquivos em cache, além do tamanho, e os baixa novamente caso não confiram.
+
+    Returns
+    -------
+    dict
+        O caminho local de cada arquivo, indexado pelo item correspondente de specs.
+    """
+    resolved = {spec: __resolve_spec(spec, cache_dir) for spec in specs}
+    host_limits = {
+        urlparse(url).netloc: BoundedSemaphore(max_per_host)
+        for url, _ in resolved.values()
+    }
+
+    def fetch(url:str, file_dir:str) -> str:
+        with host_limits[urlparse(url).netloc]:
+            return __prepare_cache(url, file_dir, logger=logger, revalidate=revalidate, verify=verify, cache_dir=cache_dir)
+
+    # specs que apontam para o mesmo arquivo compartilham um único download
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            target: executor.submit(fetch, *target)
+            for target in set(resolved.values())
+        }
+        wait(futures.values())
+
+    errors = [future.exception() for future in futures.values() if future.exception()]
+    for error in errors:
+        logger.error(f'Falha no prefetch: {error}')
+    if errors:
+        raise errors[0]
+
+    return {spec: futures[target].result() for spec, target in resolved.items()}
+
+def plan_batch(specs:list[MalhaSpec|DadosSpec|TabelaSpec|GeoSampaSpec|tuple|str], cache_dir:str='data/cache/') -> list[Plano]:
+    """
+    Agrupa os itens de um lote pelo arquivo compactado de onde são lidos.
+
+    Itens repetidos aparecem uma única vez e os planos seguem a ordem da primeira ocorrência
+    de cada arquivo em specs.
+
+    Parameters
+    ----------
+    specs : list
+        Os itens desejados, nos formatos aceitos por prefetch ou como TabelaSpec.
+    cache_dir : str
+        O diretório raiz do cache local.
+
+    Returns
+    -------
+    list[Plano]
+        Um plano por arquivo compactado, com a URL, o diretório do cache e os itens que dependem dele.
+    """
+    planos = {}
+    for spec in dict.fromkeys(specs):
+        url, file_dir = __resolve_spec(spec, cache_dir)
+        planos.setdefault((url, file_dir), []).append(spec)
+
+    return [Plano(url, file_dir, items) for (url, file_dir), items in planos.items()]
+
+def load_batch(
+    specs:list[MalhaSpec|DadosSpec|TabelaSpec|GeoSampaSpec|tuple|str],
+    max_workers:int=8,
+    max_per_host:int=2,
+    logger:Logger=getLogger(),
+    cache_dir:str='data/cache/',
+    revalidate:bool=False,
+    verify:bool=False,
+    typed:bool=True,
+    rename:bool=False,
+) -> dict:
+    """
+    Carrega um lote de malhas, planilhas e camadas do GeoSampa, baixando e abrindo cada arquivo compactado uma única vez.
+
+    Os arquivos do plano (ver plan_batch) são baixados em paralelo por prefetch. Em seguida, as
+    planilhas de um mesmo arquivo de dados são lidas juntas por download_dados_many e as malhas
+    por download_malha, ambas encontrando os arquivos já no cache.
+
+    Parameters
+    ----------
+    specs : list
+        Os itens desejados. MalhaSpec (ou uma tupla (Censo, Nivel)) devolve a malha; TabelaSpec, a
+        planilha; DadosSpec e GeoSampaSpec (ou uma string), o caminho local do arquivo.
+    max_workers : int
+        O número máximo de downloads simultâneos e de processos na leitura das planilhas.
+    max_per_host : int
+        O número máximo de downloads simultâneos para um mesmo servidor.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    cache_dir : str
+        O diretório raiz do cache local.
+    revalidate : bool
+        Se True, confere com o servidor se os arquivos em cache ainda são atuais.
+    verify : bool
+        Se True, confere o hash sha256 dos arquivos em cache, além do tamanho, e os baixa novamente caso não confiram.
+    typed : bool
+        Se False, as variáveis são lidas sem conversão de tipo.
+    rename : bool
+        Se True, as variáveis registradas no catálogo (CATALOGO) recebem o nome semântico.
+
+    Returns
+    -------
+    dict
+        O resultado de cada item, indexado pelo item correspondente de specs.
+    """
+    planos = plan_batch(specs, cache_dir)
+    paths = prefetch(
+        [spec for plano in planos for spec in plano.specs],
+        max_workers=max_workers,
+        max_per_host=max_per_host,
+        logger=logger,
+        cache_dir=cache_dir,
+        revalidate=revalidate,
+        verify=verify,
+    )
+
+    results = {}
+    for plano in planos:
+        tabelas = {}
+        for spec in plano.specs:
+            if isinstance(spec, TabelaSpec):
+                tabelas.setdefault((spec.censo, spec.nivel), []).append(spec)
+            elif isinstance(spec, tuple) and not isinstance(spec, (DadosSpec, GeoSampaSpec)):
+                malha = spec if isinstance(spec, MalhaSpec) else MalhaSpec(*spec)
+                results[spec] = download_malha(malha.censo, malha.nivel, logger=logger, cache_dir=cache_dir)
+            else:
+                results[spec] = paths[spec]
+
+        for (censo, nivel), items in tabelas.items():
+            dfs = download_dados_many(
+                censo,
+                nivel,
+                list(dict.fromkeys(spec.arquivo for spec in items)),
+                max_workers=max_workers,
+                logger=logger,
+                cache_dir=cache_dir,
+                typed=typed,
+                rename=rename,
+            )
+            results.update({spec: dfs[spec.arquivo] for spec in items})
+
+    return {spec: results[spec] for spec in specs}
+
+def cache_entries(cache_dir:str='data/cache/') -> list[dict]:
+    """
+    Lista os arquivos registrados nos manifestos de cache_dir e dos seus subdiretórios.
+
+    Parameters
+    ----------
+    cache_dir : str
+        O diretório raiz do cache local.
+
+    Returns
+    -------
+    list[dict]
+        Um item por arquivo, com o caminho, a URL de origem, o tipo ('download' ou 'derived'),
+        o tamanho em disco, incluindo um eventual download parcial, e a data do último acesso.
+    """
+    items = []
+    for file_dir, _, filenames in walk(cache_dir):
+        if MANIFEST_FILENAME not in filenames:
+            continue
+        for url, entry in __read_manifest(file_dir).items():
+            if entry.get('filename'):
+                file_path = join(file_dir, entry['filename'])
+                size = sum(getsize(path) for path in (file_path, f'{file_path}{PART_SUFFIX}') if exists(path))
+                if size:
+                    items.append({
+                        'path': file_path,
+                        'url': url,
+                        'kind': 'download',
+                        'size': size,
+                        'last_access': entry.get('last_access') or entry.get('fetched_at') or '',
+                    })
+            for name, last_access in entry.get('derived', {}).items():
+                derived_path = join(file_dir, name)
+                if exists(derived_path):
+                    items.append({
+                        'path': derived_path,
+                        'url': url,
+                        'kind': 'derived',
+                        'size': getsize(derived_path),
+                        'last_access': last_access,
+                    })
+    return items
+
+def cache_usage(cache_dir:str='data/cache/') -> dict[str, int]:
+    """
+    Calcula o espaço ocupado por cada diretório do cache, incluindo arquivos que não estão no manifesto.
+
+    Parameters
+    ----------
+    cache_dir : str
+        O diretório raiz do cache local.
+
+    Returns
+    -------
+    dict[str, int]
+        O total em bytes de cada diretório que contém arquivos.
+    """
+    usage = {}
+    for file_dir, _, filenames in walk(cache_dir):
+        size = sum(getsize(join(file_dir, name)) for name in filenames)
+        if size:
+            usage[file_dir] = size
+    return usage
+
+def set_cache_budget(max_bytes:int|None) -> None:
+    """
+    Define o tamanho máximo do cache local. Após cada download, os arquivos acessados há
+    mais tempo são removidos até que o cache volte ao limite, exceto os que estão sendo
+    lidos. None desativa o limite.
+    """
+    global CACHE_MAX_BYTES
+    CACHE_MAX_BYTES = max_bytes
+
+def gc_cache(cache_dir:str='data/cache/', max_bytes:int=None, logger:Logger=getLogger(), keep:list[str]=()) -> list[str]:
+    """
+    Remove do cache os arquivos acessados há mais tempo até que o total fique dentro do limite.
+
+    A ordem de remoção segue a data do último acesso registrada no manifesto, tanto para os
+    arquivos baixados quanto para as cópias derivadas (GeoParquet e Parquet). Arquivos sendo
+    baixados ou lidos por outra chamada, de qualquer thread ou processo, não são removidos,
+    de modo que o cache pode ficar temporariamente acima do limite.
+
+    Parameters
+    ----------
+    cache_dir : str
+        O diretório raiz do cache local.
+    max_bytes : int
+        O tamanho máximo do cache, em bytes. Caso não seja fornecido, é utilizado CACHE_MAX_BYTES.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    keep : list[str]
+        Caminhos que não devem ser removidos.
+
+    Returns
+    -------
+    list[str]
+        Os caminhos dos arquivos removidos.
+    """
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+    if max_bytes is None:
+        raise ValueError('Nenhum limite de tamanho foi definido para o cache.')
+
+    keep = {abspath(path) for path in keep}
+    items = sorted(cache_entries(cache_dir), key=lambda item: item['last_access'])
+    total = sum(item['size'] for item in items)
+
+    removed = []
+    for item in items:
+        if total <= max_bytes:
+            break
+        if abspath(item['path']) in keep:
+            continue
+        if __evict(item):
+            logger.info(f'Removendo {item["path"]} do cache ({item["size"]} bytes, último acesso em {item["last_access"] or "data desconhecida"}).')
+            total -= item['size']
+            removed.append(item['path'])
+
+    if total > max_bytes:
+        logger.warning(f'O cache em {cache_dir} continua com {total} bytes, acima do limite de {max_bytes} bytes.')
+
+    return removed
+
+def parse_size(value:str) -> int:
+    """
+    Converte um tamanho como 500M, 2G ou 1.5MiB (múltiplos de 1024) em bytes. Pode ser usada
+    como type de um argumento do argparse.
+
+    Raises
+    ------
+    ArgumentTypeError
+        Se value não for um tamanho válido.
+    """
+    from argparse import ArgumentTypeError
+
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    match = fullmatch(r'(\d+(?:\.\d+)?)([KMGT]?)I?B?', value.strip().upper())
+    if not match:
+        raise ArgumentTypeError(f'Tamanho inválido: {value}. Use, por exemplo, 500M ou 2G.')
+    return int(float(match.group(1)) * units[match.group(2)])
+
+def __format_size(size:int) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024
+    return f'{size:.1f} TiB'
+
+def __parse_spec(value:str) -> MalhaSpec|DadosSpec|GeoSampaSpec:
+    from argparse import ArgumentTypeError
+
+    kind, _, rest = value.partition(':')
+    try:
+        if kind == 'geosampa' and rest:
+            return GeoSampaSpec(rest)
+        if kind in ('malha', 'dados'):
+            censo, nivel = rest.split(':')
+            spec = MalhaSpec if kind == 'malha' else DadosSpec
+            return spec(Censo(int(censo)), Nivel(nivel))
+    except ValueError:
+        pass
+    raise ArgumentTypeError(f'Especificação inválida: {value}. Use malha:<censo>:<nivel>, dados:<censo>:<nivel> ou geosampa:<camada>.')
+
+def __main(argv:list[str]=None) -> None:
+    """
+    Linha de comando para gerenciar o cache local:
+
+        python -m utils.downloads cache ls
+        python -m utils.downloads cache du
+        python -m utils.downloads cache gc --max-bytes 2G
+        python -m utils.downloads cache warm malha:2010:setores dados:2010:setores geosampa:<camada>
+    """
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog='python -m utils.downloads', description='Gerencia o cache local de downloads.')
+    groups = parser.add_subparsers(dest='group', required=True)
+    cache = groups.add_parser('cache', help='Gerencia o cache local.')
+    cache.add_argument('--cache-dir', default='data/cache/', help='O diretório raiz do cache local.')
+    cache.add_argument('--mirror', help='Um espelho dos servidores originais: diretório local ou http://host:porta/.')
+    cache.add_argument('--offline', action='store_true', help='Não acessa a rede; falha se um arquivo não estiver no cache.')
+    actions = cache.add_subparsers(dest='action', required=True)
+    actions.add_parser('ls', help='Lista os arquivos do cache, do acesso mais recente ao mais antigo.')
+    actions.add_parser('du', help='Mostra o espaço ocupado por cada diretório do cache.')
+    gc = actions.add_parser('gc', help='Remove os arquivos acessados há mais tempo até o cache caber no limite.')
+    gc.add_argument('--max-bytes', type=parse_size, required=True, help='O tamanho máximo do cache, por exemplo 500M ou 2G.')
+    warm = actions.add_parser('warm', help='Baixa arquivos para o cache.')
+    warm.add_argument('specs', nargs='+', type=__parse_spec, help='malha:<censo>:<nivel>, dados:<censo>:<nivel> ou geosampa:<camada>.')
+    warm.add_argument('--max-workers', type=int, default=8, help='O número máximo de downloads simultâneos.')
+    warm.add_argument('--max-per-host', type=int, default=2, help='O número máximo de downloads simultâneos para um mesmo servidor.')
+    warm.add_argument('--revalidate', action='store_true', help='Confere com o servidor se os arquivos em cache ainda são atuais.')
+    warm.add_argument('--verify', action='store_true', help='Confere o hash sha256 dos arquivos em cache e baixa novamente os que não conferem.')
+    warm.add_argument('--max-bytes', type=parse_size, help='O tamanho máximo do cache, aplicado após os downloads.')
+    args = parser.parse_args(argv)
+
+    basicConfig(level=INFO, format='%(message)s')
+    logger = getLogger(__name__)
+    if args.mirror:
+        set_mirror(args.mirror)
+    if args.offline:
+        set_offline(True)
+
+    if args.action == 'ls':
+        for item in sorted(cache_entries(args.cache_dir), key=lambda item: item['last_access'], reverse=True):
+            print(f'{item["last_access"] or "-":25}  {__format_size(item["size"]):>10}  {item["kind"]:8}  {item["path"]}')
+    elif args.action == 'du':
+        usage = cache_usage(args.cache_dir)
+        for file_dir, size in sorted(usage.items()):
+            print(f'{__format_size(size):>10}  {file_dir}')
+        print(f'{__format_size(sum(usage.values())):>10}  total')
+    elif args.action == 'gc':
+        before = sum(cache_usage(args.cache_dir).values())
+        removed = gc_cache(args.cache_dir, args.max_bytes, logger=logger)
+        after = sum(cache_usage(args.cache_dir).values())
+        print(f'{len(removed)} arquivos removidos, {__format_size(before - after)} liberados.')
+    elif args.action == 'warm':
+        if args.max_bytes is not None:
+            set_cache_budget(args.max_bytes)
+        paths = prefetch(
+            args.specs,
+            max_workers=args.max_workers,
+            max_per_host=args.max_per_host,
+            logger=logger,
+            cache_dir=args.cache_dir,
+            revalidate=args.revalidate,
+            verify=args.verify,
+        )
+        for path in sorted(set(paths.values())):
+            print(path)
+
+if __name__ == '__main__':
+    __main()
\ No newline at end of file
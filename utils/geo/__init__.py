@@ -1 +1,6 @@
-from .similarity import similarity as calc_similarity
\ No newline at end of file
+def __getattr__(name:str):
+    # similarity depende do geopandas, que só é importado quando calc_similarity é usado
+    if name == 'calc_similarity':
+        from .similarity import similarity
+        return similarity
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,535 @@
+"""
+Cliente do serviço WFS do GeoSampa.
+
+As feições de uma camada são pedidas em páginas (startIndex/count), baixadas em paralelo para
+o cache local de utils.downloads (com o mesmo manifesto, locks, espelho e modo offline) e
+gravadas, na ordem, em um único arquivo GeoParquet, sem que a camada inteira seja carregada
+em memória.
+
+Camadas grandes demais para uma única consulta podem ser baixadas em blocos (tiled=True): a
+extensão pedida é dividida de acordo com o número de feições informado pelo servidor em cada
+bloco, e as feições que cruzam a borda entre blocos são gravadas uma única vez.
+
+Uso:
+
+    from utils.geosampa_client import get_client
+
+    gs_client = get_client()
+    gdf_quadras = gs_client.read_feature('quadra_viaria_editada')
+"""
+from __future__ import annotations
+
+from logging import (
+    Logger,
+    getLogger,
+)
+from os.path import (
+    exists,
+    join,
+)
+from os import (
+    remove,
+    replace,
+)
+from json import (
+    dumps,
+    load,
+)
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from threading import RLock
+from math import (
+    ceil,
+    sqrt,
+)
+import hashlib
+from typing import TYPE_CHECKING
+
+from .downloads import (
+    PART_SUFFIX,
+    derived_file,
+    download_file,
+)
+
+# geopandas e pyarrow só são importados pelos métodos que os utilizam
+if TYPE_CHECKING:
+    from geopandas import GeoDataFrame
+    from pyarrow import (
+        DataType,
+        Schema,
+        Table,
+    )
+
+WFS_URL = 'http://wfs.geosampa.prefeitura.sp.gov.br/geoserver/geoportal/wfs'
+WORKSPACE = 'geoportal'
+PAGE_SIZE = 10000
+
+# extensão do município de São Paulo em SIRGAS 2000 / UTM 23S, usada por padrão na divisão em blocos
+EXTENT = (313000, 7343000, 360000, 7415000)
+EXTENT_CRS = 'EPSG:31983'
+
+# atributo identificador de cada camada, usado para descartar as feições repetidas entre blocos;
+# nas demais camadas é usado o id da feição informado pelo GeoServer
+IDENTIFICADORES = {
+    'quadra_viaria_editada': 'cd_identificador_quadra_viaria_editada',
+}
+
+CLIENT = None
+CLIENT_LOCK = RLock()
+
+class GeoSampaClient:
+    """
+    Cliente do WFS do GeoSampa com paginação em paralelo.
+
+    Parameters
+    ----------
+    url : str
+        O endereço do serviço WFS.
+    workspace : str
+        O workspace do GeoServer, prefixado aos nomes de camada que não o informam.
+    page_size : int
+        O número de feições por página.
+    max_workers : int
+        O número máximo de páginas baixadas simultaneamente.
+    cache_dir : str
+        O diretório raiz do cache local.
+    logger : Logger
+        Um logger customizado. Caso não seja fornecido, é utilizado o logger padrão.
+    """
+
+    def __init__(
+        self,
+        url:str=WFS_URL,
+        workspace:str=WORKSPACE,
+        page_size:int=PAGE_SIZE,
+        max_workers:int=4,
+        cache_dir:str='data/cache/',
+        logger:Logger=getLogger(),
+    ):
+
+        self.url = url
+        self.workspace = workspace
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self.logger = logger
+
+    def _type_name(self, layer:str) -> str:
+
+        return layer if ':' in layer else f'{self.workspace}:{layer}'
+
+    def _layer_dir(self, layer:str) -> str:
+
+        return join(self.cache_dir, 'geosampa_wfs', self._type_name(layer).replace(':', '_'))
+
+    def feature_url(self, layer:str, start_index:int=None, count:int=None, hits:bool=False, bbox:tuple=None) -> str:
+        """
+        Monta a URL do GetFeature (WFS 2.0.0) de uma camada, em GeoJSON, ou da contagem de feições se hits=True.
+
+        bbox, quando fornecido, restringe a consulta às feições que intersectam o retângulo
+        (xmin, ymin, xmax, ymax), em EXTENT_CRS.
+        """
+        params = {
+            'service': 'WFS',
+            'version': '2.0.0',
+            'request': 'GetFeature',
+            'typeNames': self._type_name(layer),
+        }
+        if hits:
+            params['resultType'] = 'hits'
+        else:
+            params['outputFormat'] = 'application/json'
+        if start_index is not None:
+            params['startIndex'] = start_index
+        if count is not None:
+            params['count'] = count
+        if bbox is not None:
+            params['bbox'] = ','.join(str(value) for value in bbox) + f',{EXTENT_CRS}'
+
+        return f'{self.url}?{urlencode(params)}'
+
+    def _tile_name(self, bbox:tuple|None) -> str:
+
+        if bbox is None:
+            return ''
+        return 'tile.' + hashlib.sha1(repr(tuple(bbox)).encode('utf-8')).hexdigest()[:12] + '.'
+
+    def count_features(self, layer:str, revalidate:bool=False, bbox:tuple=None) -> int|None:
+        """
+        Devolve o número de feições da camada (resultType=hits), ou None se o servidor não o informar.
+        """
+        from xml.etree.ElementTree import parse
+
+        file_path = download_file(
+            self.feature_url(layer, hits=True, bbox=bbox),
+            self._layer_dir(layer),
+            filename=f'{self._tile_name(bbox)}hits.xml',
+            logger=self.logger,
+            revalidate=revalidate,
+            cache_dir=self.cache_dir,
+        )
+        matched = parse(file_path).getroot().get('numberMatched')
+        return int(matched) if matched and matched.isdigit() else None
+
+    def _download_page(self, layer:str, start_index:int, revalidate:bool, bbox:tuple=None) -> tuple[str, str]:
+
+        url = self.feature_url(layer, start_index=start_index, count=self.page_size, bbox=bbox)
+        file_path = download_file(
+            url,
+            self._layer_dir(layer),
+            filename=f'{self._tile_name(bbox)}page.{start_index}.json',
+            logger=self.logger,
+            revalidate=revalidate,
+            cache_dir=self.cache_dir,
+        )
+        return url, file_path
+
+    def download_pages(self, layer:str, revalidate:bool=False) -> list[tuple[str, str]]:
+        """
+        Baixa para o cache local, em paralelo, todas as páginas da camada.
+
+        Quando o servidor não informa o número de feições, as páginas são pedidas em lotes de
+        max_workers até que uma delas venha incompleta.
+
+        Returns
+        -------
+        list[tuple[str, str]]
+            A URL e o caminho local de cada página, na ordem.
+        """
+        total = self.count_features(layer, revalidate=revalidate)
+        self.logger.info(f'Baixando a camada {self._type_name(layer)} do GeoSampa ({total if total is not None else "?"} feições).')
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if total is not None:
+                starts = range(0, max(total, 1), self.page_size)
+                return list(executor.map(lambda index: self._download_page(layer, index, revalidate), starts))
+
+            pages = []
+            start = 0
+            while True:
+                starts = range(start, start + self.max_workers * self.page_size, self.page_size)
+                batch = list(executor.map(lambda index: self._download_page(layer, index, revalidate), starts))
+                for url, file_path in batch:
+                    pages.append((url, file_path))
+                    if self._page_length(file_path) < self.page_size:
+                        return pages
+                start = starts[-1] + self.page_size
+
+    def plan_tiles(self, layer:str, extent:tuple=EXTENT, max_features:int=None, max_depth:int=6, revalidate:bool=False) -> list[tuple[tuple, int]]:
+        """
+        Divide a extensão em blocos com no máximo max_features feições cada.
+
+        O número de feições de cada bloco é consultado (resultType=hits) em paralelo; um bloco com
+        mais de max_features feições é dividido em uma grade de n x n blocos, com n proporcional
+        à raiz da razão entre as duas contagens, até max_depth divisões. Blocos vazios são descartados.
+
+        Parameters
+        ----------
+        layer : str
+            O nome da camada.
+        extent : tuple
+            A extensão (xmin, ymin, xmax, ymax) a ser dividida, em EXTENT_CRS.
+        max_features : int
+            O número máximo de feições por bloco. Caso não seja fornecido, é utilizado page_size.
+        max_depth : int
+            O número máximo de divisões sucessivas; blocos no último nível são paginados.
+        revalidate : bool
+            Se True, confere com o servidor se as contagens em cache ainda são atuais.
+
+        Returns
+        -------
+        list[tuple[tuple, int]]
+            A extensão e o número de feições de cada bloco.
+        """
+        max_features = max_features or self.page_size
+        tiles = []
+        level = [(tuple(extent), 0)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while level:
+                counts = list(executor.map(lambda item: self.count_features(layer, revalidate=revalidate, bbox=item[0]), level))
+                next_level = []
+                for (bbox, depth), count in zip(level, counts):
+                    if count is None:
+                        raise ValueError(f'O servidor não informa o número de feições de {self._type_name(layer)}; use tiled=False.')
+                    if count == 0:
+                        continue
+                    if count <= max_features or depth >= max_depth:
+                        tiles.append((bbox, count))
+                        continue
+                    n = max(2, ceil(sqrt(count / max_features)))
+                    xmin, ymin, xmax, ymax = bbox
+                    width, height = (xmax - xmin) / n, (ymax - ymin) / n
+                    next_level.extend(
+                        ((xmin + i * width, ymin + j * height, xmin + (i + 1) * width, ymin + (j + 1) * height), depth + 1)
+                        for i in range(n)
+                        for j in range(n)
+                    )
+                level = next_level
+
+        self.logger.info(f'A camada {self._type_name(layer)} foi dividida em {len(tiles)} blocos.')
+        return tiles
+
+    def download_tiles(self, layer:str, extent:tuple=EXTENT, max_features:int=None, revalidate:bool=False) -> list[tuple[str, str]]:
+        """
+        Baixa para o cache local, em paralelo, as páginas de todos os blocos da camada (ver plan_tiles).
+
+        Returns
+        -------
+        list[tuple[str, str]]
+            A URL e o caminho local de cada página, na ordem dos blocos.
+        """
+        tiles = self.plan_tiles(layer, extent=extent, max_features=max_features, revalidate=revalidate)
+        requests = [
+            (bbox, start)
+            for bbox, count in tiles
+            for start in range(0, count, self.page_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self._download_page(layer, item[1], revalidate, bbox=item[0]), requests))
+
+    def _pages(self, layer:str, revalidate:bool, tiled:bool, extent:tuple) -> list[tuple[str, str]]:
+
+        if tiled:
+            return self.download_tiles(layer, extent=extent or EXTENT, revalidate=revalidate)
+        return self.download_pages(layer, revalidate=revalidate)
+
+    def _unique_features(self, features:list[dict], seen:set, key:str|None) -> list[dict]:
+
+        unique = []
+        for feature in features:
+            identifier = (feature.get('properties') or {}).get(key) if key else feature.get('id')
+            if identifier is None:
+                unique.append(feature)
+            elif identifier not in seen:
+                seen.add(identifier)
+                unique.append(feature)
+        return unique
+
+    def _page_length(self, file_path:str) -> int:
+
+        with open(file_path, 'rb') as f:
+            return len(load(f).get('features') or [])
+
+    def _properties_table(self, page:dict, columns:list[str]=None) -> Table:
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pylist([feature.get('properties') or {} for feature in page.get('features') or []])
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return table
+
+    def _page_table(self, page:dict, columns:list[str]=None) -> Table:
+
+        import pyarrow as pa
+        from shapely import to_wkb
+        from shapely.geometry import shape
+
+        features = page.get('features') or []
+        table = self._properties_table(page, columns)
+        geometry = [shape(feature['geometry']) if feature.get('geometry') else None for feature in features]
+        wkb = to_wkb(geometry) if geometry else []
+        return table.append_column('geometry', pa.array(wkb, pa.binary()))
+
+    def _promote(self, current:DataType, other:DataType) -> DataType:
+
+        import pyarrow as pa
+
+        try:
+            schema = pa.unify_schemas([pa.schema([('value', current)]), pa.schema([('value', other)])], promote_options='permissive')
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # tipos sem promoção comum (como número e texto) são gravados como texto
+            return pa.string()
+        return schema.field('value').type
+
+    def _schema(self, pages:list[tuple[str, str]], columns:list[str]=None) -> Schema:
+        """
+        Monta o esquema do GeoParquet a partir de todas as páginas, e não apenas da primeira: uma
+        coluna com inteiros em uma página e decimais em outra é gravada como double, e uma coluna
+        sem valores em algumas páginas recebe o tipo das demais. Colunas sem nenhum valor em
+        todas as páginas são gravadas como texto.
+        """
+        import pyarrow as pa
+        from pyproj import CRS
+
+        types = {}
+        crs_name = None
+        for _, file_path in pages:
+            with open(file_path, 'rb') as f:
+                page = load(f)
+            crs_name = crs_name or ((page.get('crs') or {}).get('properties') or {}).get('name')
+            for field in self._properties_table(page, columns).schema:
+                types[field.name] = self._promote(types[field.name], field.type) if field.name in types else field.type
+            del page
+
+        fields = [
+            pa.field(name, pa.string() if pa.types.is_null(type_) else type_)
+            for name, type_ in types.items()
+        ]
+        fields.append(pa.field('geometry', pa.binary()))
+        column = {'encoding': 'WKB', 'geometry_types': []}
+        if crs_name:
+            column['crs'] = CRS.from_user_input(crs_name).to_json_dict()
+        geo = {'version': '1.0.0', 'primary_column': 'geometry', 'columns': {'geometry': column}}
+        return pa.schema(fields, metadata={b'geo': dumps(geo).encode('utf-8')})
+
+    def _conform(self, table:Table, schema:Schema) -> Table:
+
+        import pyarrow as pa
+
+        arrays = [
+            table.column(field.name).cast(field.type) if field.name in table.column_names else pa.nulls(table.num_rows, field.type)
+            for field in schema
+        ]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _write_parquet(self, pages:list[tuple[str, str]], parquet_path:str, columns:list[str]=None, key:str=None, dedupe:bool=False) -> None:
+
+        from pyarrow.parquet import ParquetWriter
+
+        tmp_path = f'{parquet_path}{PART_SUFFIX}'
+        schema = self._schema(pages, columns)
+        writer = None
+        seen = set()
+        try:
+            # as páginas são lidas uma de cada vez, tanto para o esquema quanto para a gravação:
+            # apenas uma delas (e os identificadores já gravados, quando há blocos) fica em memória
+            writer = ParquetWriter(tmp_path, schema)
+            for _, file_path in pages:
+                with open(file_path, 'rb') as f:
+                    page = load(f)
+                if dedupe:
+                    page['features'] = self._unique_features(page.get('features') or [], seen, key)
+                table = self._page_table(page, columns)
+                if table.num_rows:
+                    writer.write_table(self._conform(table, writer.schema))
+                del page, table
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            if exists(tmp_path):
+                remove(tmp_path)
+            raise
+
+        writer.close()
+        replace(tmp_path, parquet_path)
+
+    def download_feature(
+        self,
+        layer:str,
+        columns:list[str]=None,
+        revalidate:bool=False,
+        tiled:bool=False,
+        extent:tuple=None,
+        key:str=None,
+    ) -> str:
+        """
+        Baixa a camada e a grava em GeoParquet no cache local.
+
+        O arquivo é identificado pelo conteúdo de todas as páginas e pelas colunas, de modo que
+        as chamadas seguintes o reutilizam enquanto as páginas em cache não mudarem.
+
+        Parameters
+        ----------
+        layer : str
+            O nome da camada (por exemplo, 'quadra_viaria_editada').
+        columns : list[str]
+            Os atributos a serem gravados. Caso não seja fornecido, todos são gravados.
+        revalidate : bool
+            Se True, confere com o servidor se as páginas em cache ainda são atuais.
+        tiled : bool
+            Se True, a camada é baixada em blocos (ver plan_tiles), e as feições repetidas entre
+            blocos são descartadas pelo identificador.
+        extent : tuple
+            A extensão dividida em blocos, em EXTENT_CRS. Caso não seja fornecida, é utilizada EXTENT.
+        key : str
+            O atributo identificador das feições. Caso não seja fornecido, é utilizado o de
+            IDENTIFICADORES ou, na falta dele, o id da feição.
+
+        Returns
+        -------
+        str
+            O caminho do arquivo GeoParquet.
+        """
+        pages = self._pages(layer, revalidate, tiled, extent)
+        if not pages:
+            raise ValueError(f'Nenhuma feição de {self._type_name(layer)} foi encontrada em {extent or EXTENT}.')
+        (url, file_path), others = pages[0], pages[1:]
+        key = key or IDENTIFICADORES.get(layer.split(':')[-1])
+        params = {'layer': self._type_name(layer), 'columns': columns}
+        if tiled:
+            params['key'] = key
+
+        with derived_file(
+            url,
+            self._layer_dir(layer),
+            file_path,
+            params,
+            suffix='.parquet',
+            logger=self.logger,
+            cache_dir=self.cache_dir,
+            sources=[url for url, _ in others],
+        ) as parquet_path:
+            if parquet_path is None:
+                raise RuntimeError(f'Não foi possível identificar a cópia GeoParquet da camada {layer}.')
+            if exists(parquet_path):
+                self.logger.info(f'Usando a cópia GeoParquet {parquet_path}.')
+            else:
+                self.logger.info(f'Gravando a cópia GeoParquet {parquet_path}.')
+                self._write_parquet(pages, parquet_path, columns, key=key, dedupe=tiled)
+
+        return parquet_path
+
+    def read_feature(
+        self,
+        layer:str,
+        columns:list[str]=None,
+        revalidate:bool=False,
+        tiled:bool=False,
+        extent:tuple=None,
+        key:str=None,
+    ) -> GeoDataFrame:
+        """
+        Devolve a camada como GeoDataFrame, lida da cópia GeoParquet gravada por download_feature.
+        """
+        from geopandas import read_parquet
+
+        return read_parquet(self.download_feature(layer, columns=columns, revalidate=revalidate, tiled=tiled, extent=extent, key=key))
+
+    def get_feature(self, layer:str, revalidate:bool=False, tiled:bool=False, extent:tuple=None, key:str=None) -> dict:
+        """
+        Devolve a camada inteira como um FeatureCollection GeoJSON, com as chaves 'features' e 'crs'
+        da resposta do GeoServer.
+
+        As páginas são baixadas em paralelo e concatenadas em memória; para camadas grandes,
+        prefira read_feature. Os parâmetros tiled, extent e key são os de download_feature.
+        """
+        key = key or IDENTIFICADORES.get(layer.split(':')[-1])
+        collection = {'type': 'FeatureCollection', 'features': []}
+        seen = set()
+        for _, file_path in self._pages(layer, revalidate, tiled, extent):
+            with open(file_path, 'rb') as f:
+                page = load(f)
+            features = page.get('features') or []
+            if tiled:
+                features = self._unique_features(features, seen, key)
+            collection['features'].extend(features)
+            if page.get('crs') and 'crs' not in collection:
+                collection['crs'] = page['crs']
+
+        collection['totalFeatures'] = len(collection['features'])
+        return collection
+
+def get_client() -> GeoSampaClient:
+    """Devolve o cliente compartilhado, criado na primeira chamada."""
+    global CLIENT
+    with CLIENT_LOCK:
+        if CLIENT is None:
+            CLIENT = GeoSampaClient()
+        return CLIENT
+
+def set_client(client:GeoSampaClient) -> None:
+    """Substitui o cliente compartilhado (por exemplo, por um com outro cache_dir ou page_size)."""
+    global CLIENT
+    with CLIENT_LOCK:
+        CLIENT = client
@@ -0,0 +1,639 @@
+"""
+Servidor HTTP local que imita os endpoints do IBGE e do GeoSampa usados por utils.downloads.
+
+Serve arquivos sintéticos e pequenos com os mesmos layouts dos originais (nomes dos membros
+dos zips, codificação IBM850 dos nomes no zip de dados de 2000, GeoJSON da malha de 2022,
+Content-Disposition do downloadArquivo.aspx do GeoSampa, páginas GeoJSON do WFS do GeoSampa),
+no formato de espelho esperado por utils.downloads.set_mirror: a URL https://<host>/<caminho>
+é servida em http://<servidor local>/<host>/<caminho>.
+
+Latência, banda e falhas (erros HTTP e conexões interrompidas no meio da transferência)
+são configuráveis, para exercitar novas tentativas, retomadas e o cache sem acessar a rede.
+
+Uso em código:
+
+    from utils.downloads import set_mirror
+    from utils.local_server import LocalServer
+
+    with LocalServer(latency=0.05) as server:
+        set_mirror(server.root)
+        ...
+
+Ou pela linha de comando:
+
+    python -m utils.local_server --port 8000 --latency 0.05 --bandwidth 2M
+"""
+from __future__ import annotations
+
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from email.utils import formatdate
+from os.path import (
+    basename,
+    join,
+)
+from os import (
+    listdir,
+    makedirs,
+)
+from tempfile import TemporaryDirectory
+from urllib.parse import (
+    parse_qsl,
+    unquote,
+    urlparse,
+)
+from zipfile import (
+    ZIP_DEFLATED,
+    ZipFile,
+    ZipInfo,
+)
+from threading import (
+    RLock,
+    Thread,
+)
+from collections import Counter
+from random import Random
+from time import (
+    sleep,
+    time,
+)
+from typing import (
+    TYPE_CHECKING,
+    NamedTuple,
+)
+from io import BytesIO
+import hashlib
+
+from .downloads import (
+    GEOSAMPA_DOMAIN,
+    NAMESPACE,
+    ENDPOINT,
+    CATALOGO,
+    Censo,
+    Nivel,
+    get_dataset,
+    get_malha_url,
+    parse_size,
+)
+from .geosampa_client import WFS_URL
+
+if TYPE_CHECKING:
+    from geopandas import GeoDataFrame
+
+class Archive(NamedTuple):
+    """Conteúdo servido para uma URL e, quando o servidor original o informa, o nome do Content-Disposition."""
+    content: bytes
+    filename: str = None
+    content_type: str = 'application/zip'
+
+class Faults(NamedTuple):
+    """
+    Falhas injetadas nas respostas a GET.
+
+    error_rate é a fração das requisições respondidas com error_status; truncate_rate é a
+    fração das transferências interrompidas na metade do corpo. head_status, quando
+    definido, é a resposta a todo HEAD (por exemplo 405, para servidores sem HEAD).
+    """
+    error_rate: float = 0
+    error_status: int = 503
+    truncate_rate: float = 0
+    head_status: int = None
+
+# municípios presentes nas malhas sintéticas: São Paulo e Guarulhos, para que os filtros por município tenham o que descartar
+MUNICIPIOS = {
+    '3550308': 'SÃO PAULO',
+    '3518800': 'GUARULHOS',
+}
+
+# extensão aproximada de São Paulo em SIRGAS 2000 / UTM 23S (EPSG:31983)
+EXTENT = (313000, 7343000, 360000, 7415000)
+
+# planilhas de dados agregados, com as variáveis (e o marcador de valor suprimido) de cada uma
+PLANILHAS = {
+    Censo.CENSO_2000: {
+        'Morador_SP1.XLS': {'V0237': None, 'V0238': None},
+        'Domicilio_SP1.XLS': {'V0001': None, 'V0002': None},
+    },
+    Censo.CENSO_2010: {
+        'Domicilio01_SP1.XLS': {'V001': 'X', 'V002': 'X'},
+        'Domicilio02_SP1.xls': {'V001': 'X', 'V002': 'X'},
+        'DomicilioRenda_SP1.XLS': {'V001': 'X', 'V002': 'X'},
+        'Pessoa01_SP1.XLS': {'V001': 'X', 'V002': 'X'},
+    },
+}
+
+# camadas do GeoSampa cujo zip não segue o layout padrão <nome>/<nome>.shp
+GEOSAMPA_LAYOUTS = {
+    'SIRGAS_SHP_bairroambiental': ['SIRGAS_SHP_bairroambiental/SIRGAS_SHP_bairroambiental_polygon.shp'],
+    'SIRGAS_SHP_resevamataatlantica': ['SIRGAS_SHP_resevamataatlantica/SIRGAS_SHP_resevamataatlantica_polygon.shp'],
+    'PDE_Lei_16050-14_03_Eixos de Estruturação da Transformação Urbana': ['sirgas_PDE_3-Eixos-EETU.shp'],
+    'SIRGAS_SHP_riscogeologicoatual': [
+        f'SIRGAS_SHP_riscogeologicoatual_{sigla}.shp'
+        for sigla in (
+            'AD', 'AF', 'BT', 'CL', 'CS', 'CT', 'CV', 'EM', 'FO', 'G', 'IP', 'IQ', 'IT', 'JA', 'JT',
+            'LA', 'MB', 'MG', 'MO', 'MP', 'PA', 'PE', 'PJ', 'PR', 'SA', 'SB', 'SM', 'ST', 'VP',
+        )
+    ],
+}
+
+class _IBM850ZipInfo(ZipInfo):
+    """Grava o nome do membro em IBM850, sem o flag UTF-8, como no zip de dados de 2000 do IBGE."""
+
+    def _encodeFilenameFlags(self):
+        return self.filename.encode('IBM850'), self.flag_bits
+
+def __setores(scale:int) -> list[tuple[str, str, tuple]]:
+    """
+    Gera os setores sintéticos: código, município e retângulo (xmin, ymin, xmax, ymax) em EPSG:31983.
+
+    Cada município recebe uma faixa da extensão, dividida em 10 distritos com 5 * scale setores cada.
+    """
+    xmin, ymin, xmax, ymax = EXTENT
+    faixa = (xmax - xmin) / len(MUNICIPIOS)
+    width = faixa / 10
+    height = (ymax - ymin) / (5 * scale)
+
+    setores = []
+    for m, municipio in enumerate(MUNICIPIOS):
+        for distrito in range(10):
+            for setor in range(5 * scale):
+                x0 = xmin + m * faixa + distrito * width
+                y0 = ymin + setor * height
+                codigo = f'{municipio}{distrito + 1:02d}00{setor + 1:04d}'
+                setores.append((codigo, municipio, (x0, y0, x0 + width, y0 + height)))
+    return setores
+
+def __malha(censo:Censo, nivel:Nivel, scale:int) -> GeoDataFrame:
+    from geopandas import GeoDataFrame
+    from shapely.geometry import box
+
+    setores = __setores(scale)
+    if nivel == Nivel.DISTRITOS:
+        # cada distrito cobre a união dos retângulos dos seus setores
+        distritos = {}
+        for codigo, municipio, (x0, y0, x1, y1) in setores:
+            _, _, (a, b, c, d) = distritos.get(codigo[:9], (None, None, (x0, y0, x1, y1)))
+            distritos[codigo[:9]] = (codigo[:9], municipio, (min(a, x0), min(b, y0), max(c, x1), max(d, y1)))
+        setores = list(distritos.values())
+
+    geometry = [box(*bounds) for _, _, bounds in setores]
+    if censo == Censo.CENSO_2000:
+        # o arquivo original declara um sistema de coordenadas incorreto (ver Dataset.crs no catálogo de utils.downloads)
+        records = [{'ID_': codigo} for codigo, _, _ in setores]
+        return GeoDataFrame(records, geometry=geometry, crs='EPSG:4326')
+
+    if censo == Censo.CENSO_2010:
+        if nivel == Nivel.DISTRITOS:
+            records = [
+                {'CD_GEOCODD': codigo, 'NM_DISTRIT': f'DISTRITO {codigo[-2:]}', 'CD_GEOCODM': municipio, 'NM_MUNICIP': MUNICIPIOS[municipio]}
+                for codigo, municipio, _ in setores
+            ]
+        else:
+            records = [
+                {'CD_GEOCODI': codigo, 'TIPO': 'URBANO', 'CD_GEOCODD': codigo[:9], 'CD_GEOCODM': municipio, 'NM_MUNICIP': MUNICIPIOS[municipio]}
+                for codigo, municipio, _ in setores
+            ]
+        return GeoDataFrame(records, geometry=geometry, crs='EPSG:31983').to_crs('EPSG:4674')
+
+    if nivel == Nivel.DISTRITOS:
+        records = [
+            {'CD_DIST': codigo, 'NM_DIST': f'DISTRITO {codigo[-2:]}', 'CD_MUN': municipio, 'NM_MUN': MUNICIPIOS[municipio]}
+            for codigo, municipio, _ in setores
+        ]
+    else:
+        records = [
+            {'CD_SETOR': codigo, 'CD_DIST': codigo[:9], 'CD_MUN': municipio, 'NM_MUN': MUNICIPIOS[municipio], 'v0001': int(codigo[-4:]) * 7 % 1500}
+            for codigo, municipio, _ in setores
+        ]
+    return GeoDataFrame(records, geometry=geometry, crs='EPSG:31983').to_crs('EPSG:4674')
+
+def __zip_shapefiles(layers:dict[str, GeoDataFrame]) -> bytes:
+    """Grava cada GeoDataFrame como shapefile no caminho indicado (membro .shp do zip) e devolve o zip."""
+    buffer = BytesIO()
+    with TemporaryDirectory() as tmp, ZipFile(buffer, 'w', ZIP_DEFLATED) as z:
+        for i, (shp_path, gdf) in enumerate(layers.items()):
+            layer_dir = join(tmp, str(i))
+            makedirs(layer_dir)
+            gdf.to_file(join(layer_dir, basename(shp_path)), driver='ESRI Shapefile')
+            prefix = shp_path[:-len(basename(shp_path))]
+            for name in sorted(listdir(layer_dir)):
+                z.write(join(layer_dir, name), f'{prefix}{name}')
+    return buffer.getvalue()
+
+def malha_archive(censo:Censo, nivel:Nivel, scale:int=1) -> Archive:
+    """
+    Gera o zip sintético da malha de um nível geográfico de um censo, com o layout do original.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico da malha.
+    scale : int
+        Fator de multiplicação do número de setores.
+
+    Returns
+    -------
+    Archive
+        O conteúdo do zip.
+    """
+    gdf = __malha(censo, nivel, scale)
+    name = basename(urlparse(get_malha_url(censo, nivel)).path).rsplit('.', 1)[0]
+
+    if censo == Censo.CENSO_2022:
+        buffer = BytesIO()
+        with ZipFile(buffer, 'w', ZIP_DEFLATED) as z:
+            z.writestr(f'{name}.json', gdf.to_json(drop_id=True))
+        return Archive(buffer.getvalue())
+
+    if censo == Censo.CENSO_2010:
+        name = '35DSE250GC_SIR' if nivel == Nivel.DISTRITOS else '35SEE250GC_SIR'
+    return Archive(__zip_shapefiles({f'{name}.shp': gdf}))
+
+def dados_archive(censo:Censo, nivel:Nivel, scale:int=1) -> Archive:
+    """
+    Gera o zip sintético das planilhas de dados agregados de um censo, com o layout registrado
+    no catálogo: São Paulo1/ com nomes em IBM850 para 2000 e Base informaçoes setores2010
+    universo SP_Capital/EXCEL/ para 2010.
+
+    Parameters
+    ----------
+    censo : Censo
+        O censo de referência.
+    nivel : Nivel
+        O nível geográfico dos dados.
+    scale : int
+        Fator de multiplicação do número de setores.
+
+    Returns
+    -------
+    Archive
+        O conteúdo do zip.
+    """
+    from pandas import DataFrame
+
+    dataset = get_dataset('dados', censo, nivel)
+    codigos = [codigo for codigo, municipio, _ in __setores(scale) if municipio == '3550308']
+    buffer = BytesIO()
+    with ZipFile(buffer, 'w', ZIP_DEFLATED) as z:
+        for arquivo, variaveis in PLANILHAS[censo].items():
+            df = DataFrame({dataset.key: codigos})
+            for j, (variavel, suprimido) in enumerate(variaveis.items()):
+                values = [(i * 37 + j * 11) % 900 + (0.25 if 'Renda' in arquivo else 0) for i in range(len(codigos))]
+                if suprimido:
+                    # o IBGE suprime os valores de setores com poucos domicílios
+                    values = [suprimido if i % 17 == 0 else value for i, value in enumerate(values)]
+                df[variavel] = values
+            excel = BytesIO()
+            df.to_excel(excel, index=False, engine='openpyxl')
+
+            member = dataset.member.format(arquivo=arquivo)
+            if dataset.encoding == 'IBM850':
+                info = _IBM850ZipInfo(member, date_time=(2003, 1, 1, 0, 0, 0))
+                info.compress_type = ZIP_DEFLATED
+                z.writestr(info, excel.getvalue())
+            else:
+                z.writestr(member, excel.getvalue())
+    return Archive(buffer.getvalue())
+
+def geosampa_archive(arq:str) -> Archive:
+    """
+    Gera o zip sintético de uma camada do GeoSampa a partir do parâmetro arq de downloadArquivo.aspx.
+
+    O nome da camada é o último trecho do caminho em arq; o zip traz um shapefile em
+    <nome>/<nome>.shp, salvo as camadas de GEOSAMPA_LAYOUTS, e é servido com o nome <nome>.zip.
+    """
+    from geopandas import GeoDataFrame
+    from shapely.geometry import box
+
+    # o GeoSampa recebe arq com os caracteres acentuados codificados em latin-1
+    name = unquote(arq, encoding='latin-1').replace('\\\\', '\\').rsplit('\\', 1)[-1]
+    xmin, ymin, xmax, ymax = EXTENT
+    layers = {}
+    for i, shp_path in enumerate(GEOSAMPA_LAYOUTS.get(name, [f'{name}/{name}.shp'])):
+        geometry = [
+            box(xmin + k * 1500 + i * 100, ymin + k * 2000, xmin + k * 1500 + i * 100 + 1000, ymin + k * 2000 + 1000)
+            for k in range(20)
+        ]
+        records = [{'id': f'{i}-{k}', 'nome': f'{basename(shp_path)[:-4]} {k}'} for k in range(20)]
+        # os shapefiles do GeoSampa não trazem .prj; o sistema de coordenadas é EPSG:31983
+        layers[shp_path] = GeoDataFrame(records, geometry=geometry)
+    return Archive(__zip_shapefiles(layers), filename=f'{name}.zip')
+
+def wfs_archive(params:dict[str, str], scale:int=1) -> Archive|None:
+    """
+    Gera a resposta do WFS do GeoSampa a um GetFeature: o XML com numberMatched para
+    resultType=hits, ou a página startIndex/count da camada em GeoJSON, como no GeoServer.
+    O parâmetro bbox (xmin,ymin,xmax,ymax[,crs]) seleciona as quadras que o intersectam.
+
+    Apenas a camada quadra_viaria_editada existe, com 200 * scale quadras em EPSG:31983.
+    """
+    if params.get('request') != 'GetFeature' or params.get('typeNames') != 'geoportal:quadra_viaria_editada':
+        return None
+
+    xmin, ymin, _, _ = EXTENT
+    quadras = [(k, xmin + (k % 100) * 400, ymin + (k // 100) * 400) for k in range(200 * scale)]
+    if params.get('bbox'):
+        x0, y0, x1, y1 = (float(value) for value in params['bbox'].split(',')[:4])
+        quadras = [(k, x, y) for k, x, y in quadras if x <= x1 and x + 300 >= x0 and y <= y1 and y + 300 >= y0]
+
+    total = len(quadras)
+    if params.get('resultType') == 'hits':
+        content = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0" '
+            f'numberMatched="{total}" numberReturned="0" timeStamp="2024-01-01T00:00:00Z"/>'
+        )
+        return Archive(content.encode('utf-8'), content_type='text/xml')
+
+    from json import dumps
+
+    start = int(params.get('startIndex', 0))
+    stop = min(total, start + int(params.get('count', total)))
+    features = []
+    for k, x0, y0 in quadras[start:stop]:
+        features.append({
+            'type': 'Feature',
+            'id': f'quadra_viaria_editada.{k + 1}',
+            'geometry': {'type': 'Polygon', 'coordinates': [[[x0, y0], [x0 + 300, y0], [x0 + 300, y0 + 300], [x0, y0 + 300], [x0, y0]]]},
+            'geometry_name': 'ge_poligono',
+            'properties': {
+                'cd_identificador_quadra_viaria_editada': k + 1,
+                'tx_tipo_quadra_viaria': 'Viário' if k % 10 == 0 else 'Quadra',
+                'qt_area_metro': 90000.0,
+            },
+        })
+    collection = {
+        'type': 'FeatureCollection',
+        'features': features,
+        'totalFeatures': total,
+        'numberMatched': total,
+        'numberReturned': len(features),
+        'timeStamp': '2024-01-01T00:00:00Z',
+        'crs': {'type': 'name', 'properties': {'name': 'urn:ogc:def:crs:EPSG::31983'}},
+    }
+    return Archive(dumps(collection).encode('utf-8'), filename='geoportal-quadra_viaria_editada.json', content_type='application/json')
+
+def archive_for(url:str, scale:int=1) -> Archive|None:
+    """
+    Devolve o arquivo sintético correspondente a uma URL original do IBGE ou do GeoSampa,
+    ou None se a URL não for conhecida.
+    """
+    for (tipo, censo, nivel), dataset in CATALOGO.items():
+        if url == dataset.url:
+            if tipo == 'malha':
+                return malha_archive(censo, nivel, scale)
+            if censo in PLANILHAS:
+                return dados_archive(censo, nivel, scale)
+
+    parsed = urlparse(url)
+    if url.startswith(f'{GEOSAMPA_DOMAIN}{NAMESPACE}{ENDPOINT}'):
+        params = dict(param.split('=', 1) for param in parsed.query.split('&') if '=' in param)
+        if params.get('orig') == 'DownloadCamadas' and params.get('arq'):
+            return geosampa_archive(params['arq'])
+    if url.startswith(f'{WFS_URL}?'):
+        return wfs_archive(dict(parse_qsl(parsed.query)), scale)
+
+    return None
+
+class LocalServer:
+    """
+    Servidor HTTP local com os arquivos sintéticos, executado em uma thread.
+
+    Responde a GET e HEAD com ETag e Last-Modified, atende Range/If-Range e devolve 304 a
+    If-None-Match/If-Modified-Since. Os arquivos são gerados na primeira requisição de cada
+    URL e mantidos em memória.
+
+    Parameters
+    ----------
+    host : str
+        O endereço em que o servidor escuta.
+    port : int
+        A porta; 0 escolhe uma porta livre.
+    latency : float
+        Espera, em segundos, antes de cada resposta.
+    bandwidth : float
+        Banda máxima, em bytes por segundo, de cada conexão. None não limita.
+    faults : Faults
+        As falhas injetadas nas respostas.
+    scale : int
+        Fator de multiplicação do número de setores dos arquivos sintéticos.
+    seed : int
+        Semente do sorteio das falhas.
+    """
+
+    def __init__(
+        self,
+        host:str='127.0.0.1',
+        port:int=0,
+        latency:float=0,
+        bandwidth:float=None,
+        faults:Faults=Faults(),
+        scale:int=1,
+        seed:int=0,
+    ):
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.faults = faults
+        self.scale = scale
+        self.requests = Counter()
+        self.last_modified = formatdate(time(), usegmt=True)
+        self._random = Random(seed)
+        self._archives = {}
+        self._lock = RLock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.local_server = self
+        self._thread = None
+
+    @property
+    def root(self) -> str:
+        """A raiz do espelho, para uso em utils.downloads.set_mirror."""
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def archive(self, path:str) -> tuple[Archive, str]|None:
+        """Devolve o arquivo e o ETag servidos no caminho do espelho (/<host>/<caminho>?<parâmetros>)."""
+        host, _, rest = path.lstrip('/').partition('/')
+        scheme = 'http' if host in (urlparse(GEOSAMPA_DOMAIN).netloc, urlparse(WFS_URL).netloc) else 'https'
+        url = f'{scheme}://{host}/{rest}'
+        with self._lock:
+            if url not in self._archives:
+                archive = archive_for(url, self.scale)
+                etag = f'"{hashlib.sha1(archive.content).hexdigest()[:16]}"' if archive else None
+                self._archives[url] = (archive, etag) if archive else None
+            return self._archives[url]
+
+    def set_scale(self, scale:int) -> None:
+        """
+        Altera o fator de escala e descarta os arquivos já gerados: as próximas requisições
+        recebem arquivos novos, com outro conteúdo e outro ETag.
+        """
+        with self._lock:
+            self.scale = scale
+            self._archives.clear()
+
+    def draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def serve_forever(self) -> None:
+
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def start(self) -> LocalServer:
+
+        self._thread = Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> LocalServer:
+
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+
+        self.stop()
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, code='-', size='-'):
+        # apenas os erros são registrados
+        pass
+
+    def do_HEAD(self):
+
+        self._respond(head=True)
+
+    def do_GET(self):
+
+        self._respond(head=False)
+
+    def _send_empty(self, status:int) -> None:
+
+        self.server.local_server.requests[status] += 1
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _respond(self, head:bool) -> None:
+
+        server = self.server.local_server
+        if server.latency:
+            sleep(server.latency)
+
+        try:
+            found = server.archive(self.path)
+        except Exception as e:
+            self.log_error('Falha ao gerar o arquivo de %s: %r', self.path, e)
+            self._send_empty(500)
+            return
+        if found is None:
+            self._send_empty(404)
+            return
+        archive, etag = found
+
+        faults = server.faults
+        if head and faults.head_status:
+            self._send_empty(faults.head_status)
+            return
+        if not head and faults.error_rate and server.draw() < faults.error_rate:
+            self._send_empty(faults.error_status)
+            return
+
+        # If-Modified-Since só é considerado na ausência de If-None-Match (RFC 9110, 13.1.3)
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match == etag or (if_none_match is None and self.headers.get('If-Modified-Since') == server.last_modified):
+            self._send_empty(304)
+            return
+
+        content = archive.content
+        start, end, status = 0, len(content) - 1, 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range in (etag, server.last_modified)):
+            first, _, last = range_header.removeprefix('bytes=').partition('-')
+            start = int(first)
+            end = min(int(last), len(content) - 1) if last else len(content) - 1
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(content)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                server.requests[416] += 1
+                return
+            status = 206
+
+        server.requests[status] += 1
+        self.send_response(status)
+        self.send_header('Content-Type', archive.content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+        if archive.filename:
+            self.send_header('Content-Disposition', f'attachment; filename={archive.filename}')
+        self.end_headers()
+        if head:
+            return
+
+        body = content[start:end + 1]
+        if faults.truncate_rate and server.draw() < faults.truncate_rate:
+            # envia metade do corpo e derruba a conexão
+            body = body[:len(body) // 2]
+            self.close_connection = True
+
+        chunk_size = 64 * 1024
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            self.wfile.write(chunk)
+            if server.bandwidth:
+                sleep(len(chunk) / server.bandwidth)
+
+def main(argv:list[str]=None) -> None:
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(prog='python -m utils.local_server', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='Espera antes de cada resposta, em segundos.')
+    parser.add_argument('--bandwidth', type=parse_size, default=None, help='Banda máxima por conexão, em bytes por segundo, por exemplo 512K ou 2M.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fração das requisições respondidas com --error-status.')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--truncate-rate', type=float, default=0, help='Fração das transferências interrompidas na metade.')
+    parser.add_argument('--head-status', type=int, default=None, help='Resposta a todo HEAD, por exemplo 405.')
+    parser.add_argument('--scale', type=int, default=1, help='Fator de multiplicação do número de setores.')
+    args = parser.parse_args(argv)
+
+    server = LocalServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        faults=Faults(args.error_rate, args.error_status, args.truncate_rate, args.head_status),
+        scale=args.scale,
+    )
+    print(f'Servindo em {server.root}; use utils.downloads.set_mirror({server.root!r}).')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()